@@ -2,7 +2,9 @@
 
 """App factory and extensions initialization.
 
-Defines `db` and `login_manager` instances and the `create_app`
+Defines `db`, `login_manager`, `cache`, `identity_cache`, `hasher`,
+`metrics`, `profiler`, `thumbnails`, `assets`, `jobs` and `warmup`
+instances and the `create_app`
 factory that registers blueprints and initializes extensions.
 """
 
@@ -16,17 +18,61 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 
-db = SQLAlchemy()
+from .assets import Assets
+from .cache import Cache
+from .hashing import PasswordHasher
+from .identity import IdentityCache
+from .jobs import JobQueue
+from .metrics import Metrics
+from .profiler import Profiler
+from .replicas import RoutingSession
+from .thumbnails import Thumbnails
+from .warmup import Warmup
+
+# Reads in GET requests may go to a replica bind (see replicas.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login_manager = LoginManager()
+cache = Cache()
+identity_cache = IdentityCache()
+hasher = PasswordHasher()
+metrics = Metrics()
+profiler = Profiler()
+thumbnails = Thumbnails()
+assets = Assets()
+jobs = JobQueue()
+warmup = Warmup()
 
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
 
     app.config.from_object("config.Config")
 
+    # Benchmarks and scripts point the app at other databases/backends
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    from . import database
+
+    # Pool sizing / pre-ping must be set before the engines are created
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app)
+
+    from . import replicas
+
+    replicas.init_app(app)
+
     login_manager.init_app(app)
+    cache.init_app(app)
+    identity_cache.init_app(app)
+    hasher.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)
+    thumbnails.init_app(app)
+    assets.init_app(app)
+    jobs.init_app(app)
+    warmup.init_app(app)
 
     from .routes import main
     from .auth import auth
@@ -34,4 +80,8 @@ def create_app():
     app.register_blueprint(main)
     app.register_blueprint(auth)
 
+    from .commands import register_commands
+
+    register_commands(app)
+
     return app
\ No newline at end of file
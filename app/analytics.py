@@ -0,0 +1,400 @@
+"""Enrollment history: the event log and its daily rollup.
+
+Every enrollment change appends an `EnrollmentEvent` in the same
+transaction (`record_enrollment_events`), unenrollments included, whose
+Enrollment row is deleted. `CourseEnrollmentDaily` holds per-course,
+per-UTC-day totals of that log.
+
+`catch_up()` folds the events past the `RollupState` high-water mark
+into the rollup, one grouped upsert per batch, and advances the mark in
+the same transaction with a compare-and-set. Running it again, or from
+two processes at once, never counts an event twice. It runs:
+
+- as the `rollup_enrollments` job, which writers schedule at most once
+  per `ROLLUP_DELAY` seconds per process, so the dashboard trails live
+  enrollments by about that much;
+- from `flask --app run rollup-enrollments` (cron, backfills).
+
+The instructor dashboard reads only the rollup (`course_trends`), never
+the event log or enrollment rows.
+
+SQLite serializes writers, so event ids are assigned in commit order
+and the mark cannot skip an event that commits late. Other databases
+(PostgreSQL) hand out ids before commit: there a batch only takes
+events at least `ROLLUP_LAG` seconds old and stops before the first
+younger one, so an id taken by a transaction still in flight is never
+passed. `ROLLUP_LAG` must exceed twice the longest transaction that
+logs events.
+"""
+
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import case, cast, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .jobs import PRIORITY_LOW, task, utcnow
+from .models import Course, CourseEnrollmentDaily, Enrollment, EnrollmentEvent, RollupState
+
+
+ROLLUP = "course_enrollment_daily"
+
+# Events folded per transaction
+ROLLUP_BATCH_SIZE = 50_000
+
+# Length of the dashboard's comparison periods, in days
+PERIOD_DAYS = 30
+
+Period = namedtuple("Period", ["enrolls", "unenrolls"])
+
+Trends = namedtuple(
+    "Trends", ["series", "peak", "current", "previous", "courses", "updated_at"]
+)
+
+# Monotonic time before which this process does not schedule another
+# catch-up job (one is already queued)
+_next_catch_up = 0.0
+
+
+# ----------------------------------
+# EVENTS
+# ----------------------------------
+def record_enrollment_events(kind, pairs):
+    """Append a `kind` event per (student_id, course_id) pair; caller commits."""
+
+    if not pairs:
+        return
+
+    db.session.execute(insert(EnrollmentEvent), [
+        {"student_id": student_id, "course_id": course_id, "kind": kind}
+        for student_id, course_id in pairs
+    ])
+    schedule_catch_up()
+
+
+def record_student_unenrollments(student_id):
+    """Log an unenroll event for every course the student is in; caller commits.
+
+    For deletions, whose enrollment rows go with ON DELETE CASCADE.
+    """
+
+    result = db.session.execute(
+        insert(EnrollmentEvent).from_select(
+            ["course_id", "student_id", "kind"],
+            select(Enrollment.course_id, Enrollment.student_id, literal("unenroll"))
+            .where(Enrollment.student_id == student_id)
+        )
+    )
+
+    if result.rowcount:
+        schedule_catch_up()
+
+
+def schedule_catch_up():
+    """Enqueue a delayed catch-up job, unless this process has one pending.
+
+    Events written before the job runs are all folded by it.
+    """
+
+    global _next_catch_up
+
+    delay = current_app.config["ROLLUP_DELAY"]
+    now = time.monotonic()
+
+    if now < _next_catch_up:
+        return
+
+    _next_catch_up = now + delay
+    current_app.extensions["jobs"].enqueue("rollup_enrollments", delay=delay)
+
+
+def backfill_events():
+    """Seed an empty event log from enrollment timestamps.
+
+    Adds one 'enroll' event per enrollment with a `created_at`, in time
+    order. Returns the number added, or None if the log has events
+    already (they would be counted twice).
+    """
+
+    if db.session.execute(select(EnrollmentEvent.id).limit(1)).first():
+        return None
+
+    result = db.session.execute(
+        insert(EnrollmentEvent).from_select(
+            ["course_id", "student_id", "kind", "created_at"],
+            select(
+                Enrollment.course_id,
+                Enrollment.student_id,
+                literal("enroll"),
+                Enrollment.created_at
+            )
+            .where(Enrollment.created_at.is_not(None))
+            .order_by(Enrollment.created_at, Enrollment.id)
+        )
+    )
+    db.session.commit()
+
+    return result.rowcount
+
+
+# ----------------------------------
+# ROLLUP
+# ----------------------------------
+def _day(column):
+    # UTC calendar day of a timestamp column, as a Date
+    if db.session.get_bind().dialect.name == "sqlite":
+        return func.date(column, type_=db.Date)
+    return cast(column, db.Date)
+
+
+def _upsert_daily(rows):
+    table = CourseEnrollmentDaily.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["course_id", "day"],
+                set_={
+                    "enrolls": table.c.enrolls + stmt.excluded.enrolls,
+                    "unenrolls": table.c.unenrolls + stmt.excluded.unenrolls,
+                }
+            ),
+            rows
+        )
+        return
+
+    # Portable fallback: read-modify-write, serialized by the mark update
+    for row in rows:
+        daily = db.session.get(CourseEnrollmentDaily, (row["course_id"], row["day"]))
+        if daily is None:
+            db.session.add(CourseEnrollmentDaily(**row))
+        else:
+            daily.enrolls += row["enrolls"]
+            daily.unenrolls += row["unenrolls"]
+    db.session.flush()
+
+
+def _ensure_state():
+    if db.session.get(RollupState, ROLLUP) is not None:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(RollupState(name=ROLLUP, position=0))
+    except IntegrityError:
+        pass  # created concurrently
+
+    db.session.commit()
+
+
+def _settled_before(mark):
+    # Lowest id past `mark` that may not be folded yet, or None. Only
+    # outside SQLite, where ids are not assigned in commit order: an
+    # event younger than ROLLUP_LAG may still have lower ids in flight
+    if db.session.get_bind().dialect.name == "sqlite":
+        return None
+
+    lag = timedelta(seconds=current_app.config["ROLLUP_LAG"])
+
+    return db.session.execute(
+        select(func.min(EnrollmentEvent.id)).where(
+            EnrollmentEvent.id > mark,
+            EnrollmentEvent.created_at >= func.current_timestamp() - lag
+        )
+    ).scalar()
+
+
+def _fold_batch(batch_size):
+    """Fold the next batch of events into the rollup.
+
+    Returns the number folded, 0 once caught up, or None if another
+    catch-up moved the mark first (nothing is written then).
+    """
+
+    mark = db.session.execute(
+        select(RollupState.position).where(RollupState.name == ROLLUP)
+    ).scalar_one()
+
+    batch = select(EnrollmentEvent.id).where(EnrollmentEvent.id > mark)
+
+    # The batch limit applies below the lag, never across it
+    unsettled = _settled_before(mark)
+    if unsettled is not None:
+        batch = batch.where(EnrollmentEvent.id < unsettled)
+
+    batch = batch.order_by(EnrollmentEvent.id).limit(batch_size).subquery()
+    upto = db.session.execute(select(func.max(batch.c.id))).scalar()
+
+    if upto is None:
+        db.session.rollback()
+        return 0
+
+    day = _day(EnrollmentEvent.created_at).label("day")
+    rows = [
+        row._asdict() for row in db.session.execute(
+            select(
+                EnrollmentEvent.course_id,
+                day,
+                func.sum(case((EnrollmentEvent.kind == "enroll", 1), else_=0))
+                .label("enrolls"),
+                func.sum(case((EnrollmentEvent.kind == "unenroll", 1), else_=0))
+                .label("unenrolls"),
+            )
+            .where(EnrollmentEvent.id > mark, EnrollmentEvent.id <= upto)
+            .group_by(EnrollmentEvent.course_id, day)
+        )
+    ]
+
+    # Events of since-deleted courses are gone (ON DELETE CASCADE)
+    if rows:
+        _upsert_daily(rows)
+
+    advanced = db.session.execute(
+        update(RollupState)
+        .where(RollupState.name == ROLLUP, RollupState.position == mark)
+        .values(position=upto, updated_at=utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if advanced != 1:
+        db.session.rollback()
+        return None
+
+    db.session.commit()
+    return sum(row["enrolls"] + row["unenrolls"] for row in rows)
+
+
+def catch_up(batch_size=ROLLUP_BATCH_SIZE):
+    """Fold every event past the high-water mark; return how many."""
+
+    _ensure_state()
+    folded = 0
+
+    while True:
+        count = _fold_batch(batch_size)
+        if count == 0:
+            break
+        folded += count or 0
+
+    # Mark the run even when nothing was new, for the dashboard
+    db.session.execute(
+        update(RollupState)
+        .where(RollupState.name == ROLLUP)
+        .values(updated_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return folded
+
+
+def pending_events():
+    """Whether events past the high-water mark are left to fold."""
+
+    return db.session.execute(
+        select(EnrollmentEvent.id)
+        .join(RollupState, RollupState.name == ROLLUP)
+        .where(EnrollmentEvent.id > RollupState.position)
+        .limit(1)
+    ).first() is not None
+
+
+@task("rollup_enrollments", priority=PRIORITY_LOW)
+def rollup_enrollments():
+    folded = catch_up()
+
+    # Events still inside ROLLUP_LAG get another pass once they settle
+    if pending_events():
+        current_app.extensions["jobs"].enqueue(
+            "rollup_enrollments", delay=current_app.config["ROLLUP_LAG"]
+        )
+        db.session.commit()
+
+    return folded
+
+
+# ----------------------------------
+# DASHBOARD
+# ----------------------------------
+def _add(period, enrolls, unenrolls):
+    return Period(period.enrolls + enrolls, period.unenrolls + unenrolls)
+
+
+def change(current, previous):
+    """Percent change from `previous` to `current`; None if previous is 0."""
+
+    if not previous:
+        return None
+    return round((current - previous) * 100 / abs(previous))
+
+
+def course_trends(instructor_id, days=PERIOD_DAYS, today=None):
+    """Enrollment trends of an instructor's courses, from the rollup only.
+
+    Returns Trends:
+        series: (day, enrolls, unenrolls) for each of the last `days`
+            days, oldest first, zero-filled
+        peak: largest daily value in `series` (chart scale)
+        current / previous: Period totals of the last `days` days and
+            of the `days` before them
+        courses: {course_id: {"current": Period, "previous": Period}}
+            for courses with activity in either period
+        updated_at: when the rollup last caught up (UTC), or None
+    """
+
+    today = today or utcnow().date()
+    start = today - timedelta(days=days - 1)
+    earliest = start - timedelta(days=days)
+
+    rows = db.session.execute(
+        select(
+            CourseEnrollmentDaily.course_id,
+            CourseEnrollmentDaily.day,
+            CourseEnrollmentDaily.enrolls,
+            CourseEnrollmentDaily.unenrolls,
+        )
+        .join(Course, Course.id == CourseEnrollmentDaily.course_id)
+        .where(
+            Course.instructor_id == instructor_id,
+            CourseEnrollmentDaily.day >= earliest,
+            CourseEnrollmentDaily.day <= today
+        )
+    ).all()
+
+    daily = {}
+    courses = {}
+    totals = {"current": Period(0, 0), "previous": Period(0, 0)}
+
+    for course_id, day, enrolls, unenrolls in rows:
+        period = "current" if day >= start else "previous"
+        periods = courses.setdefault(
+            course_id, {"current": Period(0, 0), "previous": Period(0, 0)}
+        )
+
+        periods[period] = _add(periods[period], enrolls, unenrolls)
+        totals[period] = _add(totals[period], enrolls, unenrolls)
+
+        if period == "current":
+            daily[day] = _add(daily.get(day, Period(0, 0)), enrolls, unenrolls)
+
+    series = [
+        (day, *daily.get(day, (0, 0)))
+        for day in (start + timedelta(days=n) for n in range(days))
+    ]
+
+    state = db.session.get(RollupState, ROLLUP)
+
+    return Trends(
+        series=series,
+        peak=max(max(enrolls, unenrolls) for _, enrolls, unenrolls in series),
+        current=totals["current"],
+        previous=totals["previous"],
+        courses=courses,
+        updated_at=state.updated_at if state else None
+    )
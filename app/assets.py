@@ -0,0 +1,239 @@
+"""Self-hosted, fingerprinted and precompressed static assets.
+
+The CSS and JS the pages load are vendored under `app/static/vendor/`
+(Bootstrap 5.3.2 and the Popper build its bundle includes) and combined
+into the bundles listed in `BUNDLES`. `build()` (run by
+`flask --app run build-assets`, e.g. while building the deploy image)
+writes into `app/static/dist/`:
+
+- `<bundle>.<hash>.<ext>`: the minified bundle, named after a hash of
+  its content;
+- `.gz` and `.br` siblings, compressed once at maximum level (`.br`
+  needs the `brotli` package);
+- `manifest.json`, mapping bundle names to fingerprinted files.
+
+Templates link bundles with `{{ asset_url("app.css") }}`. `/assets/...`
+serves the precompressed sibling the client accepts (`Accept-Encoding`,
+br before gzip) with `Cache-Control: immutable` and a one-year max-age;
+a changed bundle gets a new URL, so browsers never revalidate. If no
+manifest exists yet, the first `asset_url` call builds it.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, current_app, request, url_for
+
+from .files import send_immutable, write_atomic
+
+
+# Bundle name -> vendored sources, in order, relative to app/static
+BUNDLES = {
+    "app.css": (
+        "vendor/bootstrap-5.3.2/bootstrap.min.css",
+    ),
+    "app.js": (
+        "vendor/popper-2.11.8/popper.min.js",
+        "vendor/bootstrap-5.3.2/bootstrap.min.js",
+    ),
+}
+
+MANIFEST = "manifest.json"
+
+# (Content-Encoding, file suffix), most preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_BUILT_NAME = re.compile(r"^[\w-]+\.[0-9a-f]{12}\.(?:css|js)$")
+_SOURCE_MAP = re.compile(r"^\s*(?://[#@]|/\*[#@]) sourceMappingURL=.*$", re.MULTILINE)
+_CSS_COMMENT = re.compile(r"/\*(?!!).*?\*/", re.DOTALL)
+_CSS_SPACE = re.compile(r"\s*([{};:,>])\s*")
+
+
+# ----------------------------------
+# BUILD
+# ----------------------------------
+def minify_css(text):
+    """Drop comments (except /*! licenses */) and redundant whitespace."""
+
+    text = _CSS_COMMENT.sub("", text)
+    text = _CSS_SPACE.sub(r"\1", text)
+    return re.sub(r"\s+", " ", text).replace(";}", "}").strip()
+
+
+def minify(name, text):
+    """Minify one source file for bundle `name`.
+
+    Vendored `.min` files only lose their source-map comment (the maps
+    are not shipped). JavaScript must be vendored pre-minified: a
+    regex minifier is not safe for it.
+    """
+
+    text = _SOURCE_MAP.sub("", text).strip()
+
+    if name.endswith(".css") and ".min." not in name:
+        return minify_css(text)
+
+    return text
+
+
+def _bundle(name, sources, static_folder):
+    parts = []
+
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding="utf-8") as fh:
+            parts.append(minify(source, fh.read()))
+
+    # ";" keeps concatenated UMD scripts apart
+    separator = "\n" if name.endswith(".css") else ";\n"
+    return (separator.join(parts) + "\n").encode("utf-8")
+
+
+def _compressors():
+    compressors = [(".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        compressors.insert(0, (".br", lambda data: brotli.compress(
+            data, quality=11
+        )))
+
+    return compressors
+
+
+def build(static_folder, bundles=BUNDLES):
+    """Write every bundle, its compressed siblings and the manifest.
+
+    Returns the manifest ({bundle name: fingerprinted file name}).
+    Unchanged bundles keep their files; stale ones are left for
+    `prune`, since pages rendered before a deploy may still link them.
+    """
+
+    dist = os.path.join(static_folder, "dist")
+    os.makedirs(dist, exist_ok=True)
+
+    compressors = _compressors()
+    manifest = {}
+
+    for name, sources in bundles.items():
+        data = _bundle(name, sources, static_folder)
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        manifest[name] = filename
+
+        path = os.path.join(dist, filename)
+        if not os.path.exists(path):
+            for suffix, compress in compressors:
+                write_atomic(path + suffix, compress(data))
+            # Written last: its presence means the siblings exist
+            write_atomic(path, data)
+
+    write_atomic(
+        os.path.join(dist, MANIFEST),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    )
+
+    return manifest
+
+
+def prune(static_folder, manifest):
+    """Delete built files not referenced by `manifest`; return the count."""
+
+    dist = os.path.join(static_folder, "dist")
+    keep = {MANIFEST}
+    for filename in manifest.values():
+        keep.add(filename)
+        keep.update(filename + suffix for _, suffix in ENCODINGS)
+
+    removed = 0
+    for filename in os.listdir(dist):
+        if filename not in keep:
+            os.remove(os.path.join(dist, filename))
+            removed += 1
+
+    return removed
+
+
+# ----------------------------------
+# EXTENSION
+# ----------------------------------
+class Assets:
+    """Flask extension resolving and serving the fingerprinted bundles."""
+
+    def __init__(self, app=None):
+        self.static_folder = None
+        self.dist = None
+        self._manifest = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.dist = os.path.join(app.static_folder, "dist")
+        self._manifest = None
+
+        app.add_url_rule("/assets/<name>", "asset", self.serve)
+        app.add_template_global(self.url, "asset_url")
+        app.extensions["assets"] = self
+
+    def manifest(self):
+        """The bundle manifest, building the bundles if there is none."""
+
+        if self._manifest is None:
+            with self._lock:
+                if self._manifest is None:
+                    self._manifest = self._load()
+        return self._manifest
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.dist, MANIFEST), encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            current_app.logger.info(
+                "No asset manifest; building (run `flask build-assets` on deploy)"
+            )
+            return build(self.static_folder)
+
+    def url(self, name):
+        """URL of the current fingerprinted file for bundle `name`."""
+
+        return url_for("asset", name=self.manifest()[name])
+
+    def serve(self, name):
+        """Send a built bundle, precompressed if the client accepts it.
+
+        Any built file is served, not only the current one: pages cached
+        from before a deploy still link the previous fingerprints.
+        """
+
+        if not _BUILT_NAME.match(name) \
+                or not os.path.exists(os.path.join(self.dist, name)):
+            abort(404)
+
+        accepted = request.accept_encodings
+        filename = name
+        encoding = None
+
+        for candidate, suffix in ENCODINGS:
+            if accepted.quality(candidate) > 0 \
+                    and os.path.exists(os.path.join(self.dist, name + suffix)):
+                filename, encoding = name + suffix, candidate
+                break
+
+        response = send_immutable(
+            self.dist, filename, mimetype=mimetypes.guess_type(name)[0]
+        )
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.content_encoding = encoding
+        return response
@@ -1,13 +1,13 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required
 from .models import User
-from . import db
+from . import db, hasher
+from .hashing import HashingBusy
 
 """Authentication blueprint.
 
 Provides registration, login and logout routes. Uses `User` model
-and stores password hashes via Werkzeug utilities.
+and stores password hashes via the pooled `hasher` (see app/hashing.py).
 """
 
 auth = Blueprint("auth", __name__)
@@ -32,7 +32,11 @@ def register():
             flash("Email already registered!")
             return redirect(url_for("auth.register"))
 
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = hasher.hash(password)
+        except HashingBusy:
+            flash("Server busy, please try again.")
+            return render_template("register.html"), 503
 
         new_user = User(
             username=username,
@@ -63,7 +67,22 @@ def login():
 
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = user is not None and hasher.verify(user.password, password)
+        except HashingBusy:
+            flash("Server busy, please try again.")
+            return render_template("login.html"), 503
+
+        if valid:
+            # Upgrade hashes made with an older algorithm/cost; best
+            # effort, a full queue just retries on the next login
+            if hasher.needs_rehash(user.password):
+                try:
+                    user.password = hasher.hash(password)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
+
             login_user(user)
             flash("Login successful!")
             return redirect(url_for("main.home"))
@@ -0,0 +1,366 @@
+"""Bulk CSV imports: enrollments and user accounts.
+
+Enrollments
+-----------
+Input rows are `(student email, course id)` pairs, with an optional
+`email,course_id` header. Rows are parsed lazily from the file and
+processed in chunks of `IMPORT_CHUNK_SIZE`; each chunk costs:
+
+- one SELECT resolving its emails to students;
+- one SELECT resolving its course ids (and owners);
+- one batched `INSERT ... ON CONFLICT DO NOTHING RETURNING`, which
+  tells inserted pairs apart from existing ones;
+- one counter UPDATE per course touched, then a COMMIT.
+
+Every input row gets an `ImportResult` with one of these statuses:
+
+    enrolled, already_enrolled, duplicate (earlier in the same chunk),
+    invalid_row, unknown_email, not_a_student, unknown_course,
+    not_course_owner (web imports only touch the caller's courses)
+
+Users
+-----
+Input is a CSV with a `username,email[,role][,password]` header. Rows
+are processed in chunks of `USER_CHUNK_SIZE`; each chunk costs one
+SELECT per unique column to check for existing accounts, one parallel
+hashing pass over a process pool shared by the whole import, and one
+batched INSERT + COMMIT. Rows without a password get a random one-time
+initial password, which is included in the report (so treat the report
+as a secret); passwords from the CSV never are, whatever the row's
+status. Statuses:
+
+    created, invalid_row, duplicate (earlier in the file), email_taken,
+    username_taken, conflict (created concurrently by someone else)
+"""
+
+import csv
+import secrets
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db, hasher
+from .analytics import record_enrollment_events
+from .counters import adjust_enrollment_count
+from .enrollments import enroll_student, insert_ignore_statement
+from .fragments import invalidate_listings
+from .hashing import hash_many
+from .models import Course, Enrollment, User
+
+
+IMPORT_CHUNK_SIZE = 5000
+
+# Course ids outside a 64-bit INTEGER cannot even be looked up
+MIN_ID, MAX_ID = -2 ** 63, 2 ** 63 - 1
+REPORT_FIELDS = ("line", "email", "course_id", "status")
+
+ImportResult = namedtuple("ImportResult", REPORT_FIELDS)
+
+USER_CHUNK_SIZE = 1000
+USER_ROLES = ("student", "instructor")
+USER_REPORT_FIELDS = ("line", "username", "email", "status", "initial_password")
+
+UserResult = namedtuple("UserResult", USER_REPORT_FIELDS)
+
+
+# ----------------------------------
+# CSV INPUT / REPORT OUTPUT
+# ----------------------------------
+def read_enrollment_csv(stream):
+    """Yield `(line, email, course_id)` from a text CSV stream.
+
+    Blank lines and a leading header row are skipped; `course_id` is
+    returned as the raw string and validated by `import_enrollments`.
+    """
+
+    reader = csv.reader(stream)
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+
+        email = row[0].strip()
+        course_id = row[1].strip() if len(row) > 1 else ""
+
+        if reader.line_num == 1 and email.lower() in ("email", "student_email"):
+            continue
+
+        yield reader.line_num, email, course_id
+
+
+def read_user_csv(stream):
+    """Yield `(line, username, email, role, password)` from a text CSV stream.
+
+    The header row is required; `role` defaults to "student" and an
+    empty `password` asks for a generated one.
+    """
+
+    reader = csv.DictReader(stream)
+
+    for row in reader:
+        values = {key: (value or "").strip() for key, value in row.items() if key}
+
+        if not any(values.values()):
+            continue
+
+        yield (
+            reader.line_num,
+            values.get("username", ""),
+            values.get("email", ""),
+            values.get("role") or "student",
+            values.get("password", "")
+        )
+
+
+def write_report(results, stream, fields=REPORT_FIELDS):
+    """Write `results` as CSV to `stream`; return a Counter of statuses."""
+
+    writer = csv.writer(stream)
+    writer.writerow(fields)
+    summary = Counter()
+
+    for result in results:
+        writer.writerow(result)
+        summary[result.status] += 1
+
+    return summary
+
+
+# ----------------------------------
+# IMPORT
+# ----------------------------------
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert_pairs(pairs):
+    """Insert (student_id, course_id) pairs; return the set inserted."""
+
+    stmt = insert_ignore_statement()
+
+    if stmt is None:
+        # No ON CONFLICT on this dialect: one savepoint per row
+        return {pair for pair in pairs if enroll_student(*pair)}
+
+    # executemany keeps one cached statement for every chunk; the driver
+    # batches the rows and RETURNING lists only the ones inserted
+    inserted = set(db.session.execute(
+        stmt.returning(Enrollment.student_id, Enrollment.course_id),
+        [{"student_id": s, "course_id": c} for s, c in pairs]
+    ).tuples())
+
+    for course_id, count in Counter(c for _, c in inserted).items():
+        adjust_enrollment_count(course_id, count)
+
+    record_enrollment_events("enroll", sorted(inserted))
+
+    return inserted
+
+
+def _import_chunk(chunk, instructor_id):
+    results = []
+    candidates = []
+
+    for line, email, raw_course_id in chunk:
+        try:
+            course_id = int(raw_course_id)
+        except ValueError:
+            course_id = None
+
+        if course_id is not None and not MIN_ID <= course_id <= MAX_ID:
+            course_id = None
+
+        if not email or course_id is None:
+            results.append(ImportResult(line, email, raw_course_id, "invalid_row"))
+        else:
+            results.append(ImportResult(line, email, course_id, None))
+            candidates.append(len(results) - 1)
+
+    if not candidates:
+        return results
+
+    emails = {results[i].email for i in candidates}
+    course_ids = {results[i].course_id for i in candidates}
+
+    students = {
+        email: (user_id, role)
+        for email, user_id, role in db.session.execute(
+            select(User.email, User.id, User.role).where(User.email.in_(emails))
+        )
+    }
+    owners = dict(db.session.execute(
+        select(Course.id, Course.instructor_id).where(Course.id.in_(course_ids))
+    ).all())
+
+    pending = {}
+
+    for i in candidates:
+        result = results[i]
+        student = students.get(result.email)
+
+        if student is None:
+            status = "unknown_email"
+        elif student[1] != "student":
+            status = "not_a_student"
+        elif result.course_id not in owners:
+            status = "unknown_course"
+        elif instructor_id is not None and owners[result.course_id] != instructor_id:
+            status = "not_course_owner"
+        elif (student[0], result.course_id) in pending:
+            status = "duplicate"
+        else:
+            pending[(student[0], result.course_id)] = i
+            continue
+
+        results[i] = result._replace(status=status)
+
+    if pending:
+        inserted = _insert_pairs(list(pending))
+
+        for pair, i in pending.items():
+            status = "enrolled" if pair in inserted else "already_enrolled"
+            results[i] = results[i]._replace(status=status)
+
+        db.session.commit()
+
+        if inserted:
+            invalidate_listings("popularity")
+
+    return results
+
+
+def import_enrollments(rows, instructor_id=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Enroll `(line, email, course_id)` rows; yield one ImportResult each.
+
+    Each chunk is committed before its results are yielded, so an
+    interrupted import keeps everything reported so far. Pass
+    `instructor_id` to restrict the import to that instructor's courses.
+    """
+
+    for chunk in _chunks(rows, chunk_size):
+        yield from _import_chunk(chunk, instructor_id)
+
+
+# ----------------------------------
+# USER PROVISIONING
+# ----------------------------------
+def _insert_users(rows):
+    """Insert user rows; return the set of emails actually inserted."""
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        stmt = sqlite.insert(User).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(User).on_conflict_do_nothing()
+    else:
+        db.session.execute(insert(User), rows)
+        return {row["email"] for row in rows}
+
+    # Rows that lost a race with another writer are skipped, not raised
+    return set(db.session.execute(stmt.returning(User.email), rows).scalars())
+
+
+def _provision_chunk(chunk, seen_usernames, seen_emails, method, pool):
+    results = []
+    accepted = []
+
+    for line, username, email, role, _ in chunk:
+        if not username or "@" not in email or role not in USER_ROLES:
+            status = "invalid_row"
+        elif username in seen_usernames or email in seen_emails:
+            status = "duplicate"
+        else:
+            status = None
+            accepted.append(len(results))
+            seen_usernames.add(username)
+            seen_emails.add(email)
+
+        # A supplied password is hashed but never reported back
+        results.append(UserResult(line, username, email, status, ""))
+
+    if not accepted:
+        return results
+
+    emails = {results[i].email for i in accepted}
+    usernames = {results[i].username for i in accepted}
+
+    taken_emails = set(db.session.execute(
+        select(User.email).where(User.email.in_(emails))
+    ).scalars())
+    taken_usernames = set(db.session.execute(
+        select(User.username).where(User.username.in_(usernames))
+    ).scalars())
+
+    new = []
+
+    for i in accepted:
+        result = results[i]
+
+        if result.email in taken_emails:
+            results[i] = result._replace(status="email_taken")
+        elif result.username in taken_usernames:
+            results[i] = result._replace(status="username_taken")
+        else:
+            new.append(i)
+
+    # Rows without a password get a generated one, the only kind the
+    # report carries (as `initial_password`)
+    passwords = []
+    for i in new:
+        password = chunk[i][4]
+        if not password:
+            password = secrets.token_urlsafe(12)
+            results[i] = results[i]._replace(initial_password=password)
+        passwords.append(password)
+
+    if not new:
+        return results
+
+    hashes = hash_many(passwords, method, pool=pool)
+
+    created = _insert_users([
+        {
+            "username": results[i].username,
+            "email": results[i].email,
+            "role": chunk[i][3],
+            "password": password_hash,
+        }
+        for i, password_hash in zip(new, hashes)
+    ])
+    db.session.commit()
+
+    for i in new:
+        if results[i].email in created:
+            results[i] = results[i]._replace(status="created")
+        else:
+            results[i] = results[i]._replace(status="conflict", initial_password="")
+
+    return results
+
+
+def provision_users(rows, workers=None, chunk_size=USER_CHUNK_SIZE, method=None):
+    """Create accounts from `read_user_csv` rows; yield one UserResult each.
+
+    Password hashing for every chunk runs on one process pool of
+    `workers` processes (default: all cores), so throughput scales with
+    cores; uniqueness checks and inserts are one round trip per chunk.
+    """
+
+    method = method or hasher.method
+    seen_usernames = set()
+    seen_emails = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in _chunks(rows, chunk_size):
+            yield from _provision_chunk(
+                chunk, seen_usernames, seen_emails, method, pool
+            )
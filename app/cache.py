@@ -0,0 +1,196 @@
+"""Pluggable key/value cache used for rendered fragments.
+
+`Cache` is a Flask extension in the style of `db` and `login_manager`:
+it is created once in `app/__init__.py` and bound with `init_app`. The
+backend is chosen by `Config.CACHE_BACKEND`:
+
+- "memory": a per-process LRU dict bounded by `CACHE_MAX_ENTRIES`.
+  Invalidations only reach the process making them, so with several
+  workers set `CACHE_DEFAULT_TIMEOUT` to bound how long the others serve
+  stale fragments (`flask serve` refuses to start otherwise).
+- "redis": any Redis-compatible server at `CACHE_REDIS_URL` (requires
+  the `redis` package). Eviction is left to the server; run it with
+  `maxmemory-policy allkeys-lru`.
+- "null": caches nothing (handy for benchmarks and debugging).
+
+Values must be JSON-serializable so both backends behave the same.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+# ----------------------------------
+# BACKENDS
+# ----------------------------------
+class NullBackend:
+    """Backend that never stores anything."""
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set_many(self, mapping, timeout=None):
+        pass
+
+    def delete_many(self, keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU cache with optional expiry.
+
+    Entries live in this worker only, so invalidations made by one
+    process are not seen by others until the entries expire; use the
+    Redis backend when running several workers.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        values = []
+
+        with self._lock:
+            now = time.monotonic()
+
+            for key in keys:
+                entry = self._data.get(key)
+                value = None
+
+                if entry is not None:
+                    expires, value = entry
+                    if expires is not None and expires <= now:
+                        del self._data[key]
+                        value = None
+                    else:
+                        self._data.move_to_end(key)
+
+                values.append(value)
+
+        return values
+
+    def set_many(self, mapping, timeout=None):
+        expires = None if timeout is None else time.monotonic() + timeout
+
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Backend storing JSON values in a Redis-compatible server."""
+
+    def __init__(self, url, prefix="lms:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "CACHE_BACKEND='redis' requires the 'redis' package"
+            ) from exc
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+
+        raw = self._client.mget([self._key(k) for k in keys])
+        return [None if v is None else json.loads(v) for v in raw]
+
+    def set_many(self, mapping, timeout=None):
+        pipe = self._client.pipeline(transaction=False)
+
+        for key, value in mapping.items():
+            pipe.set(self._key(key), json.dumps(value), ex=timeout)
+
+        pipe.execute()
+
+    def delete_many(self, keys):
+        if keys:
+            self._client.delete(*[self._key(k) for k in keys])
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+
+# ----------------------------------
+# EXTENSION
+# ----------------------------------
+class Cache:
+    """Flask extension exposing the configured backend."""
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.timeout = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", "memory")
+        app.config.setdefault("CACHE_MAX_ENTRIES", 10000)
+        app.config.setdefault("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        app.config.setdefault("CACHE_KEY_PREFIX", "lms:")
+        app.config.setdefault("CACHE_DEFAULT_TIMEOUT", None)
+
+        kind = app.config["CACHE_BACKEND"]
+
+        if kind == "memory":
+            self.backend = MemoryBackend(app.config["CACHE_MAX_ENTRIES"])
+        elif kind == "redis":
+            self.backend = RedisBackend(
+                app.config["CACHE_REDIS_URL"],
+                prefix=app.config["CACHE_KEY_PREFIX"]
+            )
+        elif kind == "null":
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {kind!r}")
+
+        self.timeout = app.config["CACHE_DEFAULT_TIMEOUT"]
+        app.extensions["cache"] = self
+
+    def get(self, key):
+        return self.backend.get_many([key])[0]
+
+    def get_many(self, keys):
+        keys = list(keys)
+        return self.backend.get_many(keys) if keys else []
+
+    def set(self, key, value):
+        self.backend.set_many({key: value}, self.timeout)
+
+    def set_many(self, mapping):
+        if mapping:
+            self.backend.set_many(mapping, self.timeout)
+
+    def delete(self, *keys):
+        self.backend.delete_many(list(keys))
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,430 @@
+"""Flask CLI commands for database maintenance.
+
+Registered on the app by `create_app`. Run them with, e.g.:
+
+    flask --app run repair-enrollment-counts
+"""
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import pass_script_info, with_appcontext
+from sqlalchemy import text
+
+from . import db, jobs, profiler, thumbnails
+from .analytics import backfill_events, catch_up, record_student_unenrollments
+from .assets import build as build_assets, prune as prune_assets
+from .bulk import (
+    IMPORT_CHUNK_SIZE, USER_CHUNK_SIZE, USER_REPORT_FIELDS, import_enrollments,
+    provision_users, read_enrollment_csv, read_user_csv, write_report
+)
+from .counters import (
+    ensure_enrollment_count_column, release_student_enrollments,
+    repair_enrollment_counts
+)
+from .database import (
+    ensure_cascade_foreign_keys, ensure_enrollment_history,
+    ensure_thumbnail_key_column, sync_sqlite_replicas
+)
+from .enrollments import deduplicate_enrollments
+from .fragments import invalidate_cards, invalidate_listings
+from .models import Course, User
+from .search import rebuild_search_index
+from .server import RestartError, ServeError, rolling_restart, serve
+from .thumbnails import ThumbnailError, download
+
+
+# ----------------------------------
+# ENROLLMENT COUNTERS
+# ----------------------------------
+@click.command("repair-enrollment-counts")
+@with_appcontext
+def repair_enrollment_counts_command():
+    """Backfill / repair Course.enrollment_count from the enrollment table."""
+
+    if ensure_enrollment_count_column():
+        click.echo("Added course.enrollment_count column.")
+
+    fixed = repair_enrollment_counts()
+    click.echo(f"{fixed} course counter(s) corrected.")
+
+
+# ----------------------------------
+# ENROLLMENT UNIQUENESS
+# ----------------------------------
+@click.command("dedupe-enrollments")
+@with_appcontext
+def dedupe_enrollments_command():
+    """Remove duplicate enrollments and add the unique (student, course) index."""
+
+    removed = deduplicate_enrollments()
+    click.echo(f"{removed} duplicate enrollment(s) removed.")
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_enrollment_student_course "
+            "ON enrollment (student_id, course_id)"
+        ))
+    click.echo("Unique index uq_enrollment_student_course in place.")
+
+    # Counters may have included the duplicates
+    if removed:
+        fixed = repair_enrollment_counts()
+        click.echo(f"{fixed} course counter(s) corrected.")
+
+
+# ----------------------------------
+# CASCADING DELETES
+# ----------------------------------
+@click.command("enable-cascade-deletes")
+@with_appcontext
+def enable_cascade_deletes_command():
+    """Upgrade existing tables to ON DELETE CASCADE foreign keys."""
+
+    tables, orphans = ensure_cascade_foreign_keys()
+
+    if not tables:
+        click.echo("Foreign keys already cascade.")
+        return
+
+    click.echo(f"{orphans} orphaned row(s) removed.")
+    click.echo(f"Upgraded: {', '.join(tables)}.")
+
+    # Rebuilding `course` on SQLite drops its search triggers
+    if "course" in tables:
+        rebuild_search_index()
+        click.echo("Course search index rebuilt.")
+
+
+@click.command("delete-user")
+@click.argument("email")
+@click.confirmation_option(prompt="Delete this user and everything they own?")
+@with_appcontext
+def delete_user_command(email):
+    """Delete a user; their courses and enrollments go with ON DELETE CASCADE."""
+
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f"No user with email {email}")
+
+    course_ids = list(db.session.execute(
+        db.select(Course.id).where(Course.instructor_id == user.id)
+    ).scalars())
+
+    release_student_enrollments(user.id)
+    record_student_unenrollments(user.id)
+    db.session.delete(user)
+    db.session.commit()
+
+    invalidate_cards(*course_ids)
+    invalidate_listings()
+
+    click.echo(f"Deleted {user.username} and {len(course_ids)} course(s).")
+
+
+# ----------------------------------
+# READ REPLICAS
+# ----------------------------------
+@click.command("sync-replicas")
+@with_appcontext
+def sync_replicas_command():
+    """Copy the primary SQLite database onto every replica (local testing)."""
+
+    try:
+        synced = sync_sqlite_replicas()
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+
+    if not synced:
+        click.echo("No replicas configured (DATABASE_REPLICA_URLS).")
+        return
+
+    click.echo(f"Synced: {', '.join(synced)}.")
+
+
+# ----------------------------------
+# BULK ENROLLMENT IMPORT
+# ----------------------------------
+@click.command("import-enrollments")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--report", "report_path", type=click.Path(dir_okay=False),
+              help="Write the per-row CSV report here (default: PATH.report.csv).")
+@click.option("--chunk-size", default=IMPORT_CHUNK_SIZE, show_default=True,
+              help="Rows resolved, inserted and committed per transaction.")
+@with_appcontext
+def import_enrollments_command(path, report_path, chunk_size):
+    """Enroll students from a CSV of (student email, course id) rows."""
+
+    report_path = report_path or path + ".report.csv"
+
+    with open(path, newline="", encoding="utf-8-sig") as source, \
+            open(report_path, "w", newline="") as report:
+        summary = write_report(
+            import_enrollments(read_enrollment_csv(source), chunk_size=chunk_size),
+            report
+        )
+
+    for status, count in sorted(summary.items()):
+        click.echo(f"{status}: {count}")
+    click.echo(f"Report written to {report_path}")
+
+
+# ----------------------------------
+# BULK USER PROVISIONING
+# ----------------------------------
+@click.command("provision-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--report", "report_path", type=click.Path(dir_okay=False),
+              help="Write the per-row CSV report here (default: PATH.report.csv).")
+@click.option("--workers", type=int, default=None,
+              help="Hashing processes (default: all cores).")
+@click.option("--chunk-size", default=USER_CHUNK_SIZE, show_default=True,
+              help="Rows checked, hashed, inserted and committed per transaction.")
+@with_appcontext
+def provision_users_command(path, report_path, workers, chunk_size):
+    """Create accounts from a CSV with a username,email[,role][,password] header.
+
+    Generated one-time passwords are written to the report.
+    """
+
+    report_path = report_path or path + ".report.csv"
+
+    with open(path, newline="", encoding="utf-8-sig") as source, \
+            open(report_path, "w", newline="") as report:
+        summary = write_report(
+            provision_users(
+                read_user_csv(source), workers=workers, chunk_size=chunk_size
+            ),
+            report,
+            fields=USER_REPORT_FIELDS
+        )
+
+    for status, count in sorted(summary.items()):
+        click.echo(f"{status}: {count}")
+    click.echo(f"Report written to {report_path}")
+
+
+# ----------------------------------
+# FULL-TEXT SEARCH
+# ----------------------------------
+@click.command("rebuild-search-index")
+@with_appcontext
+def rebuild_search_index_command():
+    """Create (if missing) and repopulate the course full-text index."""
+
+    rebuild_search_index()
+    click.echo("Course search index rebuilt.")
+
+
+# ----------------------------------
+# THUMBNAILS
+# ----------------------------------
+@click.command("ingest-thumbnails")
+@click.option("--size", default="w=800&h=400&fit=crop&auto=format", show_default=True,
+              help="Query string appended to remote URLs (largest variant); '' for none.")
+@click.option("--limit", type=int, default=None,
+              help="Ingest at most this many distinct URLs.")
+@with_appcontext
+def ingest_thumbnails_command(size, limit):
+    """Download remote Course.thumbnail images into local resized variants."""
+
+    if ensure_thumbnail_key_column():
+        click.echo("Added course.thumbnail_key column.")
+
+    # Seeded catalogs reuse a handful of images; fetch each URL once
+    urls = list(db.session.execute(
+        db.select(Course.thumbnail).where(
+            Course.thumbnail_key.is_(None), Course.thumbnail.is_not(None)
+        ).distinct().order_by(Course.thumbnail)
+    ).scalars())[:limit]
+
+    ingested = failed = 0
+
+    for url in urls:
+        source = url
+        if size:
+            source += ("&" if "?" in url else "?") + size
+
+        try:
+            key = thumbnails.store(download(source, thumbnails.max_bytes))
+            thumbnails.render(key)
+        except ThumbnailError as exc:
+            click.echo(str(exc), err=True)
+            failed += 1
+            continue
+
+        course_ids = list(db.session.execute(
+            db.update(Course).where(
+                Course.thumbnail == url, Course.thumbnail_key.is_(None)
+            ).values(thumbnail_key=key).returning(Course.id)
+        ).scalars())
+        db.session.commit()
+
+        invalidate_cards(*course_ids)
+        ingested += 1
+
+    click.echo(f"{ingested} image(s) ingested, {failed} failed.")
+
+
+# ----------------------------------
+# ENROLLMENT TRENDS
+# ----------------------------------
+@click.command("rollup-enrollments")
+@click.option("--backfill", is_flag=True,
+              help="First log an event per timestamped enrollment (empty log only).")
+@with_appcontext
+def rollup_enrollments_command(backfill):
+    """Catch the daily enrollment rollup up with the event log."""
+
+    for added in ensure_enrollment_history():
+        click.echo(f"Added {added}.")
+
+    if backfill:
+        logged = backfill_events()
+        if logged is None:
+            click.echo("The event log is not empty; backfill skipped.")
+        else:
+            click.echo(f"{logged} enrollment event(s) backfilled.")
+
+    folded = catch_up()
+    click.echo(f"{folded} event(s) rolled up.")
+
+
+# ----------------------------------
+# STATIC ASSETS
+# ----------------------------------
+@click.command("build-assets")
+@click.option("--prune", is_flag=True,
+              help="Also delete bundles the new manifest no longer uses.")
+@with_appcontext
+def build_assets_command(prune):
+    """Write the fingerprinted, precompressed CSS/JS bundles and manifest."""
+
+    manifest = build_assets(current_app.static_folder)
+
+    for name, filename in sorted(manifest.items()):
+        click.echo(f"{name} -> {filename}")
+
+    if prune:
+        removed = prune_assets(current_app.static_folder, manifest)
+        click.echo(f"{removed} stale file(s) removed.")
+
+
+# ----------------------------------
+# BACKGROUND JOBS
+# ----------------------------------
+@click.command("jobs-worker")
+@click.option("--threads", default=2, show_default=True,
+              help="Jobs run concurrently by this process.")
+@click.option("--drain", is_flag=True,
+              help="Exit once no job is runnable instead of polling.")
+@with_appcontext
+def jobs_worker_command(threads, drain):
+    """Run queued background jobs until interrupted."""
+
+    click.echo(f"Running jobs with {threads} thread(s).")
+    jobs.run(threads, drain=drain)
+
+
+# ----------------------------------
+# PRODUCTION SERVER
+# ----------------------------------
+def _pidfile(app):
+    return app.config["SERVER_PIDFILE"] or os.path.join(
+        app.instance_path, "server.pid"
+    )
+
+
+@click.command("serve")
+@click.option("--bind", default=None, help="Address to listen on [SERVER_BIND].")
+@click.option("--workers", type=int, default=None,
+              help="Worker processes [SERVER_WORKERS].")
+@click.option("--threads", type=int, default=None,
+              help="Threads per worker [SERVER_THREADS].")
+@click.option("--timeout", type=int, default=None,
+              help="Seconds before a silent worker is restarted [SERVER_TIMEOUT].")
+@click.option("--graceful-timeout", type=int, default=None,
+              help="Seconds stopping workers get to finish [SERVER_GRACEFUL_TIMEOUT].")
+@pass_script_info
+def serve_command(info, bind, workers, threads, timeout, graceful_timeout):
+    """Serve the app with preforked, warmed-up gunicorn workers."""
+
+    # No app context here: the workers are forked from this process
+    app = info.load_app()
+    config = app.config
+
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    try:
+        serve(
+            app,
+            bind=bind or config["SERVER_BIND"],
+            workers=workers or config["SERVER_WORKERS"],
+            threads=threads or config["SERVER_THREADS"],
+            timeout=timeout or config["SERVER_TIMEOUT"],
+            graceful_timeout=graceful_timeout or config["SERVER_GRACEFUL_TIMEOUT"],
+            pidfile=_pidfile(app),
+        )
+    except ServeError as exc:
+        raise click.ClickException(str(exc))
+
+
+@click.command("serve-restart")
+@click.option("--url", default=None,
+              help="Readiness URL of the server [http://<SERVER_BIND>/readyz].")
+@click.option("--timeout", default=60, show_default=True,
+              help="Seconds the new workers get to become ready.")
+@with_appcontext
+def serve_restart_command(url, timeout):
+    """Roll the running server over to the current code without downtime."""
+
+    if url is None:
+        host, _, port = current_app.config["SERVER_BIND"].rpartition(":")
+        if host in ("", "0.0.0.0", "[::]"):
+            host = "127.0.0.1"
+        url = f"http://{host}:{port}/readyz"
+
+    try:
+        new = rolling_restart(
+            _pidfile(current_app), url, timeout=timeout, echo=click.echo
+        )
+    except RestartError as exc:
+        raise click.ClickException(str(exc))
+
+    click.echo(f"Now serving from master {new}.")
+
+
+# ----------------------------------
+# PROFILER
+# ----------------------------------
+@click.command("profiler-token")
+@click.argument("username")
+@with_appcontext
+def profiler_token_command(username):
+    """Print a signed X-Profile-Token header value for an admin USERNAME."""
+
+    try:
+        click.echo(profiler.issue_token(username))
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+
+
+def register_commands(app):
+    """Attach every maintenance command to `app.cli`."""
+
+    app.cli.add_command(repair_enrollment_counts_command)
+    app.cli.add_command(dedupe_enrollments_command)
+    app.cli.add_command(enable_cascade_deletes_command)
+    app.cli.add_command(delete_user_command)
+    app.cli.add_command(sync_replicas_command)
+    app.cli.add_command(import_enrollments_command)
+    app.cli.add_command(provision_users_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(ingest_thumbnails_command)
+    app.cli.add_command(rollup_enrollments_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(serve_command)
+    app.cli.add_command(serve_restart_command)
+    app.cli.add_command(profiler_token_command)
@@ -0,0 +1,89 @@
+"""Maintenance of the denormalized `Course.enrollment_count` column.
+
+Views adjust the counter with a single `UPDATE ... SET n = n + delta`
+in the same transaction as the enrollment change, so concurrent
+requests never lose an increment. `repair_enrollment_counts` recomputes
+every counter from the enrollment table for backfills and audits.
+"""
+
+from sqlalchemy import func, inspect, select, text
+
+from . import db
+from .models import Course, Enrollment
+
+
+def adjust_enrollment_count(course_id, delta):
+    """Add `delta` to a course's counter; caller commits."""
+
+    db.session.query(Course).filter(Course.id == course_id).update(
+        {Course.enrollment_count: Course.enrollment_count + delta},
+        synchronize_session=False
+    )
+
+
+def release_student_enrollments(student_id):
+    """Decrement the counter of every course a student is enrolled in.
+
+    Call before deleting the student: their enrollment rows then go with
+    ON DELETE CASCADE, which no counter update would otherwise see.
+    Caller commits.
+    """
+
+    enrolled = select(Enrollment.course_id).where(
+        Enrollment.student_id == student_id
+    )
+
+    db.session.execute(
+        db.update(Course)
+        .where(Course.id.in_(enrolled))
+        .values(enrollment_count=Course.enrollment_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def ensure_enrollment_count_column():
+    """Add `course.enrollment_count` to databases created before it existed.
+
+    Returns True if the column had to be added.
+    """
+
+    columns = {c["name"] for c in inspect(db.engine).get_columns("course")}
+
+    if "enrollment_count" in columns:
+        return False
+
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE course "
+            "ADD COLUMN enrollment_count INTEGER NOT NULL DEFAULT 0"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_course_enrollment_count_id "
+            "ON course (enrollment_count, id)"
+        ))
+
+    return True
+
+
+def repair_enrollment_counts():
+    """Recompute every course's counter from the enrollment table.
+
+    Only rows whose stored value is wrong are written. Returns the
+    number of courses that were corrected.
+    """
+
+    actual = (
+        select(func.count(Enrollment.id))
+        .where(Enrollment.course_id == Course.id)
+        .scalar_subquery()
+    )
+
+    result = db.session.execute(
+        db.update(Course)
+        .where(Course.enrollment_count != actual)
+        .values(enrollment_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return result.rowcount
@@ -0,0 +1,335 @@
+"""Engine-level database setup and schema upgrades.
+
+`configure(app)` runs before `db.init_app` and fills in
+`SQLALCHEMY_ENGINE_OPTIONS` from the `DATABASE_PROFILE`:
+
+- "production": explicit pool sizing (`DB_POOL_SIZE`,
+  `DB_MAX_OVERFLOW`, `DB_POOL_TIMEOUT`, `DB_POOL_RECYCLE`) and
+  pre-ping, for SQLite files and Postgres alike; on SQLite every new
+  connection also gets WAL, `busy_timeout`, `synchronous=NORMAL`,
+  `mmap_size` and `cache_size` (`SQLITE_*` settings). WAL lets readers
+  run alongside the single writer, and `busy_timeout` makes writers
+  queue instead of failing with "database is locked".
+- "default": the SQLAlchemy / SQLite defaults.
+
+Options already present in `SQLALCHEMY_ENGINE_OPTIONS` win. Each URL
+in `DATABASE_REPLICA_URLS` becomes a `replicaN` bind with the same
+options (see `replicas.py` for the routing).
+
+`init_app(app)` runs after `db.init_app` and installs the per-connection
+PRAGMAs on each of the app's engines. SQLite only enforces foreign keys
+on connections that enable them, so `PRAGMA foreign_keys=ON` is issued
+under every profile; with it the `ON DELETE CASCADE` clauses on
+`course.instructor_id` and `enrollment.student_id` /
+`enrollment.course_id` make deleting a user or a course a single
+statement on every backend.
+
+`ensure_cascade_foreign_keys` upgrades databases created before those
+clauses existed (`flask --app run enable-cascade-deletes`), and
+`ensure_thumbnail_key_column` adds the uploaded-thumbnail column
+(`flask --app run ingest-thumbnails`).
+"""
+
+import sqlite3
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateTable
+
+from . import db
+from .models import (
+    Course, CourseEnrollmentDaily, Enrollment, EnrollmentEvent, RollupState, User
+)
+
+
+# Tables whose foreign keys cascade, parents first
+CASCADE_TABLES = (Course.__table__, Enrollment.__table__)
+
+
+# ----------------------------------
+# ENGINE OPTIONS
+# ----------------------------------
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:")
+        or url.query.get("mode") == "memory"
+    )
+
+
+def engine_options(config, uri):
+    """Return the engine options the configured profile asks for `uri`."""
+
+    if config["DATABASE_PROFILE"] != "production":
+        return {}
+
+    url = make_url(uri)
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+
+    # In-memory SQLite keeps one connection per thread; nothing to size
+    if _is_memory_sqlite(url):
+        return options
+
+    options.update(
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+    )
+
+    if url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"connect_timeout": config["DB_CONNECT_TIMEOUT"]}
+
+    return options
+
+
+def sqlite_pragmas(config):
+    """Return the PRAGMAs run on every new SQLite connection, in order."""
+
+    pragmas = [("foreign_keys", "ON")]
+
+    if config["DATABASE_PROFILE"] == "production":
+        # busy_timeout first: switching to WAL may have to wait for a lock
+        pragmas = [
+            ("busy_timeout", config["SQLITE_BUSY_TIMEOUT"]),
+            ("journal_mode", "WAL"),
+            ("synchronous", "NORMAL"),
+            ("mmap_size", config["SQLITE_MMAP_SIZE"]),
+            ("cache_size", config["SQLITE_CACHE_SIZE"]),
+        ] + pragmas
+
+    return pragmas
+
+
+def configure(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS; call before `db.init_app`."""
+
+    app.config.setdefault("DATABASE_PROFILE", "production")
+    app.config.setdefault("DB_POOL_SIZE", 5)
+    app.config.setdefault("DB_MAX_OVERFLOW", 10)
+    app.config.setdefault("DB_POOL_TIMEOUT", 10)
+    app.config.setdefault("DB_POOL_RECYCLE", 1800)
+    app.config.setdefault("DB_POOL_PRE_PING", True)
+    app.config.setdefault("DB_CONNECT_TIMEOUT", 10)
+    app.config.setdefault("SQLITE_BUSY_TIMEOUT", 5000)
+    app.config.setdefault("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+    app.config.setdefault("SQLITE_CACHE_SIZE", -64000)
+
+    options = engine_options(app.config, app.config["SQLALCHEMY_DATABASE_URI"])
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    # One bind per read replica, under the same profile as the primary
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    for i, url in enumerate(app.config.get("DATABASE_REPLICA_URLS") or ()):
+        binds.setdefault(f"replica{i}", {"url": url, **engine_options(app.config, url)})
+
+
+# ----------------------------------
+# CONNECTION SETUP
+# ----------------------------------
+def _pragma_hook(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return on_connect
+
+
+def init_app(app):
+    """Install the per-connection setup on every engine of `app`."""
+
+    hook = _pragma_hook(sqlite_pragmas(app.config))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", hook)
+
+
+# ----------------------------------
+# REPLICAS
+# ----------------------------------
+def sync_sqlite_replicas():
+    """Copy the primary SQLite database over each replica bind.
+
+    Stands in for real replication when trying the read/write split
+    locally; returns the bind keys that were refreshed.
+    """
+
+    if db.engine.dialect.name != "sqlite":
+        raise RuntimeError("Only SQLite replicas can be synced this way")
+
+    synced = []
+    source = db.engine.raw_connection()
+
+    try:
+        for key, engine in db.engines.items():
+            if not (isinstance(key, str) and key.startswith("replica")):
+                continue
+
+            target = engine.raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+            synced.append(key)
+    finally:
+        source.close()
+
+    return synced
+
+
+# ----------------------------------
+# SCHEMA UPGRADE
+# ----------------------------------
+def _stale_tables(conn):
+    inspector = inspect(conn)
+    stale = []
+
+    for table in CASCADE_TABLES:
+        for fk in inspector.get_foreign_keys(table.name):
+            ondelete = (fk.get("options") or {}).get("ondelete") or ""
+            if ondelete.upper() != "CASCADE":
+                stale.append((table, fk))
+
+    return stale
+
+
+def _delete_orphans(conn):
+    """Remove rows the new constraints would reject; return the count."""
+
+    removed = conn.execute(
+        Enrollment.__table__.delete().where(
+            Enrollment.course_id.not_in(db.select(Course.id))
+            | Enrollment.student_id.not_in(db.select(User.id))
+        )
+    ).rowcount
+    removed += conn.execute(
+        Course.__table__.delete().where(
+            Course.instructor_id.not_in(db.select(User.id))
+        )
+    ).rowcount
+
+    return removed
+
+
+def _rebuild_sqlite_table(conn, table):
+    # SQLite cannot alter a constraint: copy into a table created from
+    # the model, swap it in and recreate the indexes
+    columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    shared = ", ".join(c.name for c in table.columns if c.name in columns)
+    temp = f"{table.name}_new"
+
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    ddl = ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {temp} (", 1)
+
+    conn.execute(text(ddl))
+    conn.execute(text(
+        f"INSERT INTO {temp} ({shared}) SELECT {shared} FROM {table.name}"
+    ))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {temp} RENAME TO {table.name}"))
+
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _alter_postgres_constraint(conn, table, fk):
+    name = fk["name"]
+    columns = ", ".join(fk["constrained_columns"])
+    referred = ", ".join(fk["referred_columns"])
+
+    conn.execute(text(f'ALTER TABLE "{table.name}" DROP CONSTRAINT "{name}"'))
+    conn.execute(text(
+        f'ALTER TABLE "{table.name}" ADD CONSTRAINT "{name}" '
+        f'FOREIGN KEY ({columns}) REFERENCES "{fk["referred_table"]}" ({referred}) '
+        f"ON DELETE CASCADE"
+    ))
+
+
+def ensure_cascade_foreign_keys():
+    """Give existing tables their ON DELETE CASCADE foreign keys.
+
+    Returns `(tables_upgraded, orphans_removed)`. On SQLite the affected
+    tables are rebuilt, which drops the course search triggers; the
+    caller should run `rebuild_search_index()` afterwards.
+    """
+
+    dialect = db.engine.dialect.name
+
+    with db.engine.connect() as conn:
+        stale = _stale_tables(conn)
+        conn.rollback()
+
+        if not stale:
+            return [], 0
+
+        if dialect == "sqlite":
+            # Only takes effect outside a transaction; needed for the swap
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            conn.commit()
+
+        orphans = _delete_orphans(conn)
+
+        if dialect == "sqlite":
+            for table in dict.fromkeys(table for table, _ in stale):
+                _rebuild_sqlite_table(conn, table)
+        elif dialect == "postgresql":
+            for table, fk in stale:
+                _alter_postgres_constraint(conn, table, fk)
+        else:
+            raise RuntimeError(f"Unsupported database dialect {dialect!r}")
+
+        conn.commit()
+
+        if dialect == "sqlite":
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            conn.commit()
+
+    return [table.name for table in dict.fromkeys(table for table, _ in stale)], orphans
+
+
+def ensure_enrollment_history():
+    """Add enrollment timestamps and the trend tables to older databases.
+
+    Returns what had to be added. Existing enrollments keep a NULL
+    `created_at`: their dates are unknown, so trends start from here.
+    """
+
+    added = []
+    columns = {c["name"] for c in inspect(db.engine).get_columns("enrollment")}
+
+    if "created_at" not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE enrollment ADD COLUMN created_at DATETIME"))
+        added.append("enrollment.created_at column")
+
+    existing = set(inspect(db.engine).get_table_names())
+    for model in (EnrollmentEvent, CourseEnrollmentDaily, RollupState):
+        if model.__tablename__ not in existing:
+            model.__table__.create(db.engine)
+            added.append(f"{model.__tablename__} table")
+
+    return added
+
+
+def ensure_thumbnail_key_column():
+    """Add `course.thumbnail_key` to databases created before it existed.
+
+    Returns True if the column had to be added.
+    """
+
+    columns = {c["name"] for c in inspect(db.engine).get_columns("course")}
+
+    if "thumbnail_key" in columns:
+        return False
+
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE course ADD COLUMN thumbnail_key VARCHAR(16)"))
+
+    return True
@@ -0,0 +1,135 @@
+"""Single-statement enrollment writes.
+
+`enroll_student` relies on the unique `(student_id, course_id)` index on
+`Enrollment` and lets the database resolve duplicates with
+`INSERT ... ON CONFLICT DO NOTHING`, so concurrent clicks can never
+create two rows and no preliminary SELECT is needed.
+
+Both writers also log an `EnrollmentEvent` for the trend rollups (see
+app.analytics) in the caller's transaction.
+
+A course that does not exist is reported by its foreign key, again
+without a SELECT: ON CONFLICT only absorbs the duplicate, so the FK
+violation still raises and `enroll_student` turns it into
+`UnknownCourse`.
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .analytics import record_enrollment_events
+from .counters import adjust_enrollment_count
+from .models import Course, Enrollment
+
+
+class UnknownCourse(LookupError):
+    """Raised when enrolling into a course that does not exist."""
+
+
+def insert_ignore_statement():
+    """Return an INSERT into `Enrollment` that skips existing pairs.
+
+    Execute it with a list of parameter dicts for a cached, batched
+    executemany. Returns None on dialects without ON CONFLICT support.
+    """
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        stmt = sqlite.insert(Enrollment)
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(Enrollment)
+    else:
+        return None
+
+    return stmt.on_conflict_do_nothing(
+        index_elements=["student_id", "course_id"]
+    )
+
+
+def insert_ignore_enrollments(rows):
+    """Return an INSERT of `rows` that skips existing (student, course) pairs.
+
+    `rows` is a list of dicts with `student_id` and `course_id`. Returns
+    None on dialects without ON CONFLICT support.
+    """
+
+    stmt = insert_ignore_statement()
+
+    return None if stmt is None else stmt.values(rows)
+
+
+def enroll_student(student_id, course_id):
+    """Enroll a student; return False if they were already enrolled.
+
+    The caller commits. On success the course counter is bumped in the
+    same transaction. Raises UnknownCourse if there is no such course;
+    the caller must roll back then.
+    """
+
+    row = {"student_id": student_id, "course_id": course_id}
+    stmt = insert_ignore_enrollments([row])
+
+    if stmt is not None:
+        try:
+            inserted = db.session.execute(stmt).rowcount == 1
+        except IntegrityError as exc:
+            # Duplicates are skipped, so this is the course FK
+            raise UnknownCourse(course_id) from exc
+    else:
+        # Portable fallback: let the unique index reject the duplicate
+        try:
+            with db.session.begin_nested():
+                db.session.add(Enrollment(**row))
+            inserted = True
+        except IntegrityError as exc:
+            if db.session.get(Course, course_id) is None:
+                raise UnknownCourse(course_id) from exc
+            inserted = False
+
+    if inserted:
+        adjust_enrollment_count(course_id, 1)
+        record_enrollment_events("enroll", [(student_id, course_id)])
+
+    return inserted
+
+
+def unenroll_student(student_id, course_id):
+    """Remove an enrollment; return False if there was none. Caller commits."""
+
+    deleted = db.session.execute(
+        db.delete(Enrollment)
+        .where(Enrollment.student_id == student_id)
+        .where(Enrollment.course_id == course_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if deleted:
+        adjust_enrollment_count(course_id, -deleted)
+        record_enrollment_events("unenroll", [(student_id, course_id)])
+
+    return bool(deleted)
+
+
+def deduplicate_enrollments():
+    """Delete duplicate (student, course) rows, keeping the oldest id.
+
+    Returns the number of rows removed. Must run before the unique index
+    can be created on a database that already holds duplicates.
+    """
+
+    keep = (
+        select(func.min(Enrollment.id))
+        .group_by(Enrollment.student_id, Enrollment.course_id)
+    )
+
+    result = db.session.execute(
+        db.delete(Enrollment)
+        .where(Enrollment.id.not_in(keep))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return result.rowcount
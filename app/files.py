@@ -0,0 +1,56 @@
+"""Content-addressed files on disk: writing and serving them.
+
+Built asset bundles (app.assets) and thumbnail variants
+(app.thumbnails) are named after a hash of their content, so a file
+never changes once written and its URL can be cached for good:
+
+- `write_atomic` writes a file under a temporary name and renames it,
+  so readers (the serving routes, other workers, a front-end server)
+  only ever see complete files. Files are made world-readable;
+  `mkstemp` would leave them 0600, unreadable by a front-end server
+  running as another user.
+- `send_immutable` serves one with a one-year, immutable
+  `Cache-Control`.
+"""
+
+import os
+import tempfile
+
+from flask import send_from_directory
+
+
+# One year: the longest max-age caches honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def write_atomic(path, data):
+    """Atomically (re)place the file `path`, mode 0644.
+
+    `data` is the content as bytes, or a callable writing it to the
+    binary file object it is given. Concurrent writers of the same
+    content-addressed file produce equal bytes; the last rename wins.
+    """
+
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            if callable(data):
+                data(fh)
+            else:
+                fh.write(data)
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def send_immutable(directory, filename, **options):
+    """`send_from_directory` for a content-addressed file, cached for good."""
+
+    response = send_from_directory(
+        directory, filename, max_age=IMMUTABLE_MAX_AGE, **options
+    )
+    response.cache_control.immutable = True
+    return response
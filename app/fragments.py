@@ -0,0 +1,239 @@
+"""Cached catalog pages and rendered course-card fragments.
+
+Two kinds of entries are stored in `cache`:
+
+- listing pages: the (course id, instructor id) pairs and cursors of
+  one catalog page, keyed by sort, order, page size and cursor. Each
+  sort has a generation token in its key; bumping the token retires
+  every cached page of that sort at once.
+- cards: the rendered, user-independent HTML of one course card
+  (`_course_card.html`), keyed by course id and that course's version
+  token. `invalidate_cards` bumps the token rather than deleting the
+  card, and `course_cards` reads it before loading the row, so a card
+  rendered from a row read before an invalidation is stored under the
+  retired token and never served.
+
+Anything that depends on the viewer (Edit/Delete, Enroll/Enrolled) is
+applied by the view on top of these entries and never becomes part of a
+key. Pages ordered for one viewer (enrolled-first / own-first) are not
+cached at all (`viewer_page`); their cards still are.
+"""
+
+import os
+from collections import namedtuple
+
+from flask import render_template
+from markupsafe import Markup
+
+from . import cache
+
+
+SORTS = ("title", "instructor", "popularity")
+
+# One card on a catalog page: ids for per-user logic plus cached HTML
+CatalogCard = namedtuple("CatalogCard", ["id", "instructor_id", "html"])
+
+
+# ----------------------------------
+# KEYS
+# ----------------------------------
+def _generation_key(sort_by):
+    return f"catalog:gen:{sort_by}"
+
+
+def _version_key(course_id):
+    return f"catalog:version:{course_id}"
+
+
+def _card_key(course_id, version):
+    return f"catalog:card:{course_id}:{version}"
+
+
+def _new_token():
+    # Random rather than a counter so a token lost to eviction can
+    # never be recreated with an old value and revive stale pages
+    return os.urandom(6).hex()
+
+
+def _generation(sort_by):
+    key = _generation_key(sort_by)
+    token = cache.get(key)
+
+    if token is None:
+        token = _new_token()
+        cache.set(key, token)
+
+    return token
+
+
+def _versions(course_ids):
+    """Return {course id: version token}, creating missing tokens."""
+
+    tokens = cache.get_many([_version_key(course_id) for course_id in course_ids])
+    versions = dict(zip(course_ids, tokens))
+
+    created = {
+        course_id: _new_token()
+        for course_id, token in versions.items()
+        if token is None
+    }
+    cache.set_many({
+        _version_key(course_id): token
+        for course_id, token in created.items()
+    })
+    versions.update(created)
+
+    return versions
+
+
+def _page_key(sort_by, order, per_page, after, before):
+    return ":".join([
+        "catalog:page",
+        sort_by,
+        _generation(sort_by),
+        order,
+        str(per_page),
+        after or "",
+        before or "",
+    ])
+
+
+# ----------------------------------
+# INVALIDATION
+# ----------------------------------
+def invalidate_listings(*sorts):
+    """Retire all cached pages of `sorts` (every sort if none given)."""
+
+    cache.set_many({
+        _generation_key(sort_by): _new_token()
+        for sort_by in (sorts or SORTS)
+    })
+
+
+def invalidate_cards(*course_ids):
+    """Retire the rendered cards of `course_ids`.
+
+    The old cards are left for the backend to evict.
+    """
+
+    cache.set_many({
+        _version_key(course_id): _new_token()
+        for course_id in course_ids
+    })
+
+
+# ----------------------------------
+# LOOKUP
+# ----------------------------------
+class CachedPage:
+    """The user-independent part of one catalog page."""
+
+    def __init__(self, entries, next_cursor, prev_cursor, rendered=None):
+        self.entries = entries
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Cards rendered while filling a miss: {course id: html}
+        self.rendered = rendered or {}
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def catalog_page(sort_by, order, per_page, after, before, fetch):
+    """Return the CachedPage for these options.
+
+    On a miss `fetch()` must return a KeysetPage of card rows
+    (`loaders.cards`); their cards are rendered for this response only.
+    They are not cached: the rows were read before their version tokens
+    could be, so `course_cards` stores them on a later request instead.
+    """
+
+    key = _page_key(sort_by, order, per_page, after, before)
+    stored = cache.get(key)
+
+    if stored is not None:
+        return CachedPage(
+            [tuple(entry) for entry in stored["entries"]],
+            stored["next"],
+            stored["prev"]
+        )
+
+    page = fetch()
+    entries = [(course.id, course.instructor_id) for course in page.items]
+
+    rendered = {course.id: _render_card(course) for course in page.items}
+
+    cache.set(key, {
+        "entries": entries,
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
+    })
+
+    return CachedPage(entries, page.next_cursor, page.prev_cursor, rendered)
+
+
+def viewer_page(page):
+    """Wrap a KeysetPage ordered for one viewer; the page is not cached.
+
+    Its rows need `id` and `instructor_id`; the cards still come from
+    (and go to) the cache through `course_cards`.
+    """
+
+    return CachedPage(
+        [(row.id, row.instructor_id) for row in page.items],
+        page.next_cursor,
+        page.prev_cursor
+    )
+
+
+def course_cards(page, load):
+    """Return a CatalogCard for each entry of the CachedPage `page`.
+
+    Cards missing from the cache are rendered from the card rows
+    returned by `load(missing_ids)` and stored under the version
+    tokens read before the load. Entries whose course no longer exists
+    are dropped.
+    """
+
+    cards = {
+        course_id: Markup(html)
+        for course_id, html in page.rendered.items()
+    }
+
+    wanted = [course_id for course_id, _ in page.entries if course_id not in cards]
+    versions = _versions(wanted)
+    cached = cache.get_many([
+        _card_key(course_id, versions[course_id]) for course_id in wanted
+    ])
+    cards.update(
+        (course_id, Markup(html))
+        for course_id, html in zip(wanted, cached)
+        if html is not None
+    )
+
+    missing = [course_id for course_id in wanted if course_id not in cards]
+
+    if missing:
+        rendered = {course.id: _render_card(course) for course in load(missing)}
+        cache.set_many({
+            _card_key(course_id, versions[course_id]): html
+            for course_id, html in rendered.items()
+        })
+        cards.update(
+            (course_id, Markup(html)) for course_id, html in rendered.items()
+        )
+
+    return [
+        CatalogCard(course_id, instructor_id, cards[course_id])
+        for course_id, instructor_id in page.entries
+        if course_id in cards
+    ]
+
+
+def _render_card(course):
+    return str(render_template("_course_card.html", course=course))
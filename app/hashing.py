@@ -0,0 +1,165 @@
+"""Password hashing off the request worker.
+
+`PasswordHasher` runs Werkzeug's `generate_password_hash` and
+`check_password_hash` on a bounded process pool so that a burst of
+logins cannot monopolise the CPU of the request workers. At most
+`PASSWORD_HASH_MAX_PENDING` hashes may be queued; past that callers
+wait up to `PASSWORD_HASH_QUEUE_TIMEOUT` seconds and then get
+`HashingBusy`, which the views turn into a 503.
+
+The algorithm and cost come from `Config`:
+
+    PASSWORD_HASH_ALGORITHM = "scrypt"   # or "pbkdf2:sha256"
+    PASSWORD_HASH_COST = 32768           # scrypt N / pbkdf2 iterations
+
+`PASSWORD_HASH_WORKERS` processes are started per web process; `flask
+serve` sizes the pool from its own settings when it is unset (see
+`server.hash_workers`).
+
+`needs_rehash` tells the login view when a stored hash was made with
+other parameters so it can be upgraded transparently.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full (back-pressure)."""
+
+
+def hash_method(algorithm, cost):
+    """Return the Werkzeug method string for `algorithm` at `cost`."""
+
+    if algorithm == "scrypt":
+        return f"scrypt:{cost}:8:1"
+    if algorithm.startswith("pbkdf2"):
+        return f"{algorithm}:{cost}"
+
+    raise ValueError(f"Unsupported password hash algorithm {algorithm!r}")
+
+
+# Run in the pool processes; must be importable top-level functions
+def hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(stored, password):
+    return check_password_hash(stored, password)
+
+
+def hash_many(passwords, method, workers=None, chunksize=64, pool=None):
+    """Hash `passwords` in parallel, preserving order.
+
+    For offline bulk work (seeding, imports) where using every core is
+    the point; request handlers use `PasswordHasher` instead. Runs on
+    `pool` if given (callers hashing in several batches), otherwise on
+    a temporary pool of `workers` processes.
+    """
+
+    if pool is not None:
+        return list(pool.map(
+            hash_password, passwords, repeat(method), chunksize=chunksize
+        ))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return hash_many(passwords, method, chunksize=chunksize, pool=pool)
+
+
+class PasswordHasher:
+    """Flask extension wrapping a per-process hashing pool."""
+
+    def __init__(self, app=None):
+        self.method = hash_method("scrypt", 32768)
+        self.workers = 0
+        self.queue_timeout = None
+        self._slots = None
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_ALGORITHM", "scrypt")
+        app.config.setdefault("PASSWORD_HASH_COST", 32768)
+        app.config.setdefault("PASSWORD_HASH_WORKERS", None)
+        app.config.setdefault("PASSWORD_HASH_MAX_PENDING", 64)
+        app.config.setdefault("PASSWORD_HASH_QUEUE_TIMEOUT", 5.0)
+
+        self.method = hash_method(
+            app.config["PASSWORD_HASH_ALGORITHM"],
+            app.config["PASSWORD_HASH_COST"]
+        )
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        if self.workers is None:
+            self.workers = min(4, os.cpu_count() or 1)
+        self.queue_timeout = app.config["PASSWORD_HASH_QUEUE_TIMEOUT"]
+        self._slots = threading.BoundedSemaphore(
+            app.config["PASSWORD_HASH_MAX_PENDING"]
+        )
+        app.extensions["password_hasher"] = self
+
+    # ----------------------------------
+    # POOL
+    # ----------------------------------
+    def _executor(self):
+        # Created lazily, and again after a fork, so preforking servers
+        # never share a pool with their parent
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, func, *args):
+        # PASSWORD_HASH_WORKERS = 0 hashes inline (development, tests)
+        if not self.workers:
+            return func(*args)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusy()
+
+        try:
+            return self._executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def warm(self):
+        """Start the pool's processes now rather than on the first login."""
+
+        if not self.workers:
+            return
+
+        pool = self._executor()
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+
+    # ----------------------------------
+    # API
+    # ----------------------------------
+    def hash(self, password):
+        """Hash `password` with the configured algorithm and cost."""
+
+        return self._run(hash_password, password, self.method)
+
+    def verify(self, stored, password):
+        """Return True if `password` matches the stored hash."""
+
+        return self._run(verify_password, stored, password)
+
+    def needs_rehash(self, stored):
+        """Return True if `stored` was made with other parameters."""
+
+        return stored.split("$", 1)[0] != self.method
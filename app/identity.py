@@ -0,0 +1,96 @@
+"""Identity cache for the Flask-Login user loader.
+
+Without it `load_user` runs a `SELECT` on `user` for every request made
+by a logged-in user. `IdentityCache` keeps a bounded, per-process
+TTL/LRU map of user id -> `UserSnapshot` (id, username, role), which is
+everything the views and templates read from `current_user`.
+
+Entries are evicted when the ORM updates or deletes the user, and in
+any case expire after `USER_CACHE_TTL` seconds, which bounds staleness
+for changes made by other processes.
+"""
+
+import threading
+
+from cachetools import TTLCache
+from flask_login import UserMixin
+
+
+class UserSnapshot(UserMixin):
+    """Read-only stand-in for `User` used as `current_user`."""
+
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.role)
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.username} ({self.role})>"
+
+
+class IdentityCache:
+    """Bounded TTL/LRU cache of UserSnapshot objects with hit/miss counters."""
+
+    def __init__(self, app=None):
+        self._entries = TTLCache(maxsize=1, ttl=0)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("USER_CACHE_MAX_ENTRIES", 10000)
+        app.config.setdefault("USER_CACHE_TTL", 60)
+
+        self._entries = TTLCache(
+            maxsize=app.config["USER_CACHE_MAX_ENTRIES"],
+            ttl=app.config["USER_CACHE_TTL"]
+        )
+        app.extensions["identity_cache"] = self
+
+    def get(self, user_id):
+        """Return the cached snapshot for `user_id`, or None."""
+
+        with self._lock:
+            snapshot = self._entries.get(user_id)
+
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return snapshot
+
+    def put(self, user):
+        """Cache and return a snapshot of the ORM `user`."""
+
+        snapshot = UserSnapshot.from_user(user)
+
+        with self._lock:
+            self._entries[snapshot.id] = snapshot
+
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,395 @@
+"""Durable background jobs run by a local worker pool.
+
+Jobs are rows of the `job` table (`models.Job`) in the app database, so
+they survive restarts and need no external broker. A task is a plain
+function registered under a name:
+
+    @task("render_thumbnail", max_attempts=5)
+    def render_thumbnail(key):
+        ...
+
+and a view enqueues it onto the current session:
+
+    jobs.enqueue("render_thumbnail", key=key, owner_id=current_user.id)
+    db.session.commit()
+
+Enqueueing is transactional: the job only exists once the view's own
+commit succeeds, and that commit wakes the local workers.
+
+Workers claim the runnable job with the highest priority (then the
+oldest) with a guarded UPDATE, so each job runs once even with several
+threads or processes polling. A task that raises is retried up to
+`max_attempts` times with exponential backoff (`JOBS_RETRY_BACKOFF`
+seconds, doubled per attempt); after that it is marked failed with its
+traceback. Jobs whose worker died are requeued once their lease
+(`JOBS_LEASE_SECONDS`) runs out.
+
+Every web process starts `JOBS_WORKERS` worker threads on its first
+request. With `JOBS_WORKERS = 0` jobs wait for a dedicated worker:
+
+    flask --app run jobs-worker --threads 2
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, event, select, update
+from sqlalchemy.exc import OperationalError
+
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+STATUSES = ("queued", "running", "done", "failed")
+
+Task = namedtuple("Task", ["func", "priority", "max_attempts"])
+
+# Task name -> Task, filled by the @task decorator at import time
+TASKS = {}
+
+log = logging.getLogger("app.jobs")
+
+
+class UnknownTask(LookupError):
+    """Raised when enqueueing or running a name no task registered."""
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def task(name, priority=PRIORITY_NORMAL, max_attempts=3):
+    """Register the decorated function as the task `name`.
+
+    It is called with the JSON-decoded keyword arguments given to
+    `enqueue`, inside an app context; its return value (JSON
+    serialisable) becomes the job's result.
+    """
+
+    def register(func):
+        TASKS[name] = Task(func, priority, max_attempts)
+        return func
+
+    return register
+
+
+class JobQueue:
+    """Flask extension enqueueing jobs and running the worker threads."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 0
+        self.poll_interval = 1.0
+        self.lease = 300
+        self.backoff = 5.0
+        self._db = None
+        self._job = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._last_reap = 0.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JOBS_WORKERS", 1)
+        app.config.setdefault("JOBS_POLL_INTERVAL", 1.0)
+        app.config.setdefault("JOBS_LEASE_SECONDS", 300)
+        app.config.setdefault("JOBS_RETRY_BACKOFF", 5.0)
+
+        # The models need `db`, which exists by the time apps are created
+        from . import db
+        from .models import Job
+
+        self.app = app
+        self._db = db
+        self._job = Job
+        self.workers = app.config["JOBS_WORKERS"]
+        self.poll_interval = app.config["JOBS_POLL_INTERVAL"]
+        self.lease = app.config["JOBS_LEASE_SECONDS"]
+        self.backoff = app.config["JOBS_RETRY_BACKOFF"]
+
+        if not event.contains(db.session, "after_commit", self._after_commit):
+            event.listen(db.session, "after_commit", self._after_commit)
+
+        if self.workers:
+            app.before_request(self._ensure_workers)
+
+        app.extensions["jobs"] = self
+
+    # ----------------------------------
+    # ENQUEUE
+    # ----------------------------------
+    def enqueue(self, name, priority=None, delay=0, owner_id=None, **payload):
+        """Add a `name` job to the current session and return it.
+
+        It becomes visible to workers when the caller commits.
+        `priority` defaults to the task's; `delay` postpones the first
+        run by that many seconds.
+        """
+
+        spec = TASKS.get(name)
+        if spec is None:
+            raise UnknownTask(name)
+
+        now = utcnow()
+        job = self._job(
+            name=name,
+            payload=json.dumps(payload),
+            status="queued",
+            priority=spec.priority if priority is None else priority,
+            attempts=0,
+            max_attempts=spec.max_attempts,
+            run_at=now + timedelta(seconds=delay),
+            owner_id=owner_id,
+            created_at=now
+        )
+
+        self._db.session.add(job)
+        self._db.session.info["jobs_enqueued"] = True
+        return job
+
+    def _after_commit(self, session):
+        if session.info.pop("jobs_enqueued", False):
+            self._wake.set()
+
+    @staticmethod
+    def describe(job):
+        """JSON-ready status of `job` (the status endpoint's body)."""
+
+        return {
+            "id": job.id,
+            "name": job.name,
+            "status": job.status,
+            "priority": job.priority,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "run_at": job.run_at.isoformat() + "Z",
+            "created_at": job.created_at.isoformat() + "Z",
+            "finished_at": job.finished_at and job.finished_at.isoformat() + "Z",
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.last_error.strip().splitlines()[-1] if job.last_error else None,
+        }
+
+    # ----------------------------------
+    # CLAIM / FINISH
+    # ----------------------------------
+    def _claim(self, worker_id):
+        """Lease the next runnable job to `worker_id`; None if there is none."""
+
+        Job = self._job
+
+        while True:
+            now = utcnow()
+
+            # Read first: an idle poll never takes the write lock
+            with self._db.engine.connect() as conn:
+                job_id = conn.execute(
+                    select(Job.id)
+                    .where(Job.status == "queued", Job.run_at <= now)
+                    .order_by(Job.priority.desc(), Job.id)
+                    .limit(1)
+                ).scalar()
+
+            if job_id is None:
+                return None
+
+            # Guarded by status: of two workers racing for the job,
+            # only one UPDATE matches
+            with self._db.engine.begin() as conn:
+                claimed = conn.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(
+                        status="running",
+                        locked_by=worker_id,
+                        locked_at=now,
+                        attempts=Job.attempts + 1
+                    )
+                    .returning(Job.id, Job.name, Job.payload,
+                               Job.attempts, Job.max_attempts)
+                ).first()
+
+            if claimed is not None:
+                return claimed
+
+    def _finish(self, claimed, worker_id, **values):
+        Job = self._job
+
+        with self._db.engine.begin() as conn:
+            conn.execute(
+                update(Job)
+                .where(Job.id == claimed.id, Job.locked_by == worker_id)
+                .values(locked_by=None, locked_at=None, **values)
+            )
+
+    def _reap(self):
+        """Requeue (or fail) running jobs whose lease has expired."""
+
+        Job = self._job
+        expired = utcnow() - timedelta(seconds=self.lease)
+
+        with self._db.engine.begin() as conn:
+            return conn.execute(
+                update(Job)
+                .where(Job.status == "running", Job.locked_at < expired)
+                .values(
+                    status=case(
+                        (Job.attempts >= Job.max_attempts, "failed"),
+                        else_="queued"
+                    ),
+                    locked_by=None,
+                    locked_at=None,
+                    last_error="Worker lease expired"
+                )
+            ).rowcount
+
+    # ----------------------------------
+    # RUN
+    # ----------------------------------
+    def run_job(self, claimed, worker_id):
+        """Run one claimed job and record its outcome."""
+
+        spec = TASKS.get(claimed.name)
+
+        try:
+            if spec is None:
+                raise UnknownTask(claimed.name)
+            result = spec.func(**json.loads(claimed.payload))
+        except Exception:
+            error = traceback.format_exc()
+            log.warning("Job %s (%s) failed, attempt %s/%s",
+                        claimed.id, claimed.name,
+                        claimed.attempts, claimed.max_attempts)
+            self._db.session.rollback()
+
+            if claimed.attempts >= claimed.max_attempts:
+                self._finish(claimed, worker_id, status="failed",
+                             last_error=error, finished_at=utcnow())
+            else:
+                # Exponential backoff with jitter so retries spread out
+                delay = self.backoff * 2 ** (claimed.attempts - 1)
+                delay *= random.uniform(0.8, 1.2)
+                self._finish(claimed, worker_id, status="queued",
+                             last_error=error,
+                             run_at=utcnow() + timedelta(seconds=delay))
+        else:
+            self._finish(claimed, worker_id, status="done",
+                         result=json.dumps(result), finished_at=utcnow())
+        finally:
+            self._db.session.remove()
+
+    def work(self, worker_id, stop, drain=False):
+        """Claim and run jobs until `stop` is set.
+
+        With `drain`, return as soon as no job is runnable.
+        """
+
+        with self.app.app_context():
+            while not stop.is_set():
+                try:
+                    if self._last_reap < utcnow().timestamp() - min(60, self.lease / 2):
+                        self._last_reap = utcnow().timestamp()
+                        self._reap()
+
+                    claimed = self._claim(worker_id)
+                except OperationalError:
+                    # Typically "database is locked"; try again shortly
+                    log.warning("Job poll failed", exc_info=True)
+                    claimed = None
+
+                if claimed is not None:
+                    self.run_job(claimed, worker_id)
+                    continue
+
+                if drain:
+                    return
+
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # ----------------------------------
+    # WORKER THREADS
+    # ----------------------------------
+    def ensure_table(self):
+        """Create the job table if this database predates it."""
+
+        with self.app.app_context():
+            self._job.__table__.create(self._db.engine, checkfirst=True)
+
+    def _spawn(self, threads, stop, drain=False):
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        spawned = []
+
+        for n in range(threads):
+            thread = threading.Thread(
+                target=self.work,
+                args=(f"{prefix}:{n}", stop, drain),
+                name=f"jobs-{n}",
+                daemon=True
+            )
+            thread.start()
+            spawned.append(thread)
+
+        return spawned
+
+    def start(self, threads):
+        """Start `threads` daemon worker threads in this process."""
+
+        self.ensure_table()
+        self._threads.extend(self._spawn(threads, self._stop))
+
+    def run(self, threads, drain=False):
+        """Run `threads` workers in the foreground (`flask jobs-worker`).
+
+        Returns on Ctrl-C once the running jobs finish, or with `drain`
+        as soon as no job is runnable.
+        """
+
+        self.ensure_table()
+        stop = threading.Event()
+        workers = self._spawn(threads, stop, drain)
+
+        try:
+            for thread in workers:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            self._wake.set()
+            for thread in workers:
+                thread.join()
+
+    def _ensure_workers(self):
+        # Started per process on its first request, so preforking
+        # servers get workers in each child, not in the parent
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads = []
+                self._stop = threading.Event()
+                self.start(self.workers)
+                self._pid = os.getpid()
+
+    def stop(self, timeout=None):
+        """Ask the worker threads to exit and wait for them."""
+
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._pid = None
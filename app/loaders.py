@@ -0,0 +1,66 @@
+"""Loading profiles for the list views in `app.routes`.
+
+Each profile is a column projection: plain, read-only rows holding just
+what the template shows, fetched in one query with the joins they need.
+The rows never enter the session identity map, and cards never load the
+unbounded `Course.description` (the excerpt is cut in SQL). Full ORM
+entities are only loaded by the views that edit them.
+"""
+
+from sqlalchemy import func
+
+from . import db
+from .models import Course, Enrollment, User
+
+
+# Characters of `Course.description` shown on a card
+EXCERPT_LENGTH = 100
+
+
+def excerpt(column, length=EXCERPT_LENGTH):
+    """The first `length` characters of `column`, cut by the database."""
+
+    return func.substr(column, 1, length)
+
+
+# ----------------------------------
+# CATALOG CARDS (_course_card.html, dashboard.html)
+# ----------------------------------
+def card_columns():
+    return (
+        Course.id,
+        Course.instructor_id,
+        Course.title,
+        Course.thumbnail,
+        Course.thumbnail_key,
+        Course.enrollment_count,
+        excerpt(Course.description).label("excerpt"),
+        User.username.label("instructor_name"),
+    )
+
+
+def cards(*extra):
+    """Query of card rows (plus `extra` columns), instructor joined."""
+
+    return db.session.query(*card_columns(), *extra).join(
+        User, Course.instructor_id == User.id
+    )
+
+
+# ----------------------------------
+# STUDENT DASHBOARD (student_dashboard.html)
+# ----------------------------------
+# The dashboard shows the whole description
+def enrolled_courses(student_id):
+    return db.session.query(
+        Course.id,
+        Course.title,
+        Course.description,
+        User.username.label("instructor_name"),
+    ).join(
+        Enrollment, Enrollment.course_id == Course.id
+    ).outerjoin(
+        User, Course.instructor_id == User.id
+    ).filter(
+        Enrollment.student_id == student_id
+    ).order_by(Enrollment.id)
@@ -0,0 +1,340 @@
+"""Per-endpoint request, SQL and template instrumentation.
+
+`Metrics` is a Flask extension (created in `app/__init__.py`) that
+hooks into:
+
+- Flask request hooks: request latency and status per endpoint;
+- SQLAlchemy engine events: statement count, time and errors per
+  endpoint, plus a slow-query log (`app.slow_sql` logger) with parameters for
+  statements slower than `SLOW_QUERY_THRESHOLD` seconds;
+- Flask template signals: template render time per endpoint.
+
+Everything is aggregated in process memory and served in Prometheus
+text format at `/metrics`. Per statement the cost is two
+`perf_counter()` calls and a few attribute updates on `g`; the shared
+registry is touched once per request, so it can stay on under load.
+Each worker process reports its own numbers.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, abort, g, has_request_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+slow_sql_log = logging.getLogger("app.slow_sql")
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+# ----------------------------------
+# REGISTRY
+# ----------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ) + "}"
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        names = self.label_names + ("le",)
+
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(
+                    f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+
+        return lines
+
+
+# ----------------------------------
+# EXTENSION
+# ----------------------------------
+class Metrics:
+    """Flask extension collecting metrics and serving `/metrics`."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.slow_query_threshold = 0.2
+        self.token = None
+
+        self.requests = Counter(
+            "lms_http_requests_total",
+            "Requests by endpoint, method and status.",
+            ("endpoint", "method", "status")
+        )
+        self.latency = Histogram(
+            "lms_http_request_duration_seconds",
+            "Request latency by endpoint.",
+            ("endpoint",),
+            LATENCY_BUCKETS
+        )
+        self.sql_statements = Counter(
+            "lms_sql_statements_total",
+            "SQL statements executed by endpoint.",
+            ("endpoint",)
+        )
+        self.sql_seconds = Counter(
+            "lms_sql_duration_seconds_total",
+            "Time spent executing SQL by endpoint.",
+            ("endpoint",)
+        )
+        self.sql_per_request = Histogram(
+            "lms_sql_statements_per_request",
+            "SQL statements issued per request by endpoint.",
+            ("endpoint",),
+            (0, 1, 2, 3, 5, 10, 20, 50, 100)
+        )
+        self.sql_errors = Counter(
+            "lms_sql_errors_total",
+            "SQL statements that raised, by endpoint.",
+            ("endpoint",)
+        )
+        self.slow_queries = Counter(
+            "lms_sql_slow_queries_total",
+            "Statements slower than SLOW_QUERY_THRESHOLD by endpoint.",
+            ("endpoint",)
+        )
+        self.render = Histogram(
+            "lms_template_render_seconds",
+            "Template render time per request by endpoint.",
+            ("endpoint",),
+            RENDER_BUCKETS
+        )
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.config.setdefault("SLOW_QUERY_THRESHOLD", 0.2)
+
+        app.extensions["metrics"] = self
+
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        self.slow_query_threshold = app.config["SLOW_QUERY_THRESHOLD"]
+        self.token = app.config["METRICS_TOKEN"]
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+
+        # Listening on the Engine class covers every engine/bind
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor):
+            event.listen(Engine, "before_cursor_execute", _before_cursor)
+            event.listen(Engine, "after_cursor_execute", _after_cursor)
+            event.listen(Engine, "handle_error", _cursor_error)
+
+        app.add_url_rule("/metrics", "metrics", self.view)
+
+    # ----------------------------------
+    # REQUEST HOOKS
+    # ----------------------------------
+    def _before_request(self):
+        g.metrics = {
+            "start": time.perf_counter(),
+            "sql_count": 0,
+            "sql_time": 0.0,
+            "sql_errors": 0,
+            "slow": 0,
+            "render_time": 0.0,
+            "render_stack": [],
+            "slow_threshold": self.slow_query_threshold,
+        }
+
+    def _after_request(self, response):
+        state = g.pop("metrics", None)
+        if state is None:
+            return response
+
+        elapsed = time.perf_counter() - state["start"]
+        endpoint = (request.endpoint or "unmatched",)
+
+        with self._lock:
+            self.requests.inc(
+                (endpoint[0], request.method, str(response.status_code))
+            )
+            self.latency.observe(endpoint, elapsed)
+            self.sql_statements.inc(endpoint, state["sql_count"])
+            self.sql_seconds.inc(endpoint, state["sql_time"])
+            self.sql_per_request.observe(endpoint, state["sql_count"])
+            if state["sql_errors"]:
+                self.sql_errors.inc(endpoint, state["sql_errors"])
+            if state["slow"]:
+                self.slow_queries.inc(endpoint, state["slow"])
+            if state["render_time"]:
+                self.render.observe(endpoint, state["render_time"])
+
+        return response
+
+    def _before_render(self, sender, template, context, **extra):
+        state = g.get("metrics")
+        if state is not None:
+            state["render_stack"].append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        state = g.get("metrics")
+        if state is None or not state["render_stack"]:
+            return
+
+        started = state["render_stack"].pop()
+        # Only the outermost template counts; includes are nested in it
+        if not state["render_stack"]:
+            state["render_time"] += time.perf_counter() - started
+
+    # ----------------------------------
+    # EXPOSITION
+    # ----------------------------------
+    def view(self):
+        """Serve all metrics in Prometheus text format."""
+
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+            abort(403)
+
+        return Response(
+            self.render_text(),
+            mimetype="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    def render_text(self):
+        from . import identity_cache
+
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.sql_statements,
+                           self.sql_seconds, self.sql_per_request,
+                           self.sql_errors, self.slow_queries, self.render):
+                lines.extend(metric.render())
+
+        stats = identity_cache.stats()
+        lines.extend([
+            "# HELP lms_identity_cache_hits_total load_user cache hits.",
+            "# TYPE lms_identity_cache_hits_total counter",
+            f"lms_identity_cache_hits_total {stats['hits']}",
+            "# HELP lms_identity_cache_misses_total load_user cache misses.",
+            "# TYPE lms_identity_cache_misses_total counter",
+            f"lms_identity_cache_misses_total {stats['misses']}",
+            "# HELP lms_identity_cache_size Cached identities.",
+            "# TYPE lms_identity_cache_size gauge",
+            f"lms_identity_cache_size {stats['size']}",
+        ])
+
+        return "\n".join(lines) + "\n"
+
+
+# ----------------------------------
+# ENGINE EVENTS
+# ----------------------------------
+# A connection runs one statement at a time, so it holds a single start
+# time. A statement that raises gets no after_cursor_execute; its start
+# is taken by handle_error instead, and it is counted as an error.
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics" in g:
+        conn.info["metrics_start"] = time.perf_counter()
+    else:
+        conn.info.pop("metrics_start", None)
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    _record(conn, statement, parameters)
+
+
+def _cursor_error(context):
+    if context.connection is not None:
+        _record(context.connection, context.statement, context.parameters,
+                failed=True)
+
+
+def _record(conn, statement, parameters, failed=False):
+    started = conn.info.pop("metrics_start", None)
+    if started is None or not has_request_context():
+        return
+
+    elapsed = time.perf_counter() - started
+    state = g.get("metrics")
+    if state is None:
+        return
+
+    state["sql_count"] += 1
+    state["sql_time"] += elapsed
+    if failed:
+        state["sql_errors"] += 1
+
+    if elapsed >= state["slow_threshold"]:
+        state["slow"] += 1
+        slow_sql_log.warning(
+            "slow query %.3fs in %s: %s | params=%.500r",
+            elapsed, request.endpoint, " ".join(statement.split()), parameters
+        )
@@ -1,5 +1,6 @@
-from . import db, login_manager
+from . import db, identity_cache, login_manager
 from flask_login import UserMixin
+from sqlalchemy import event
 
 """app.models
 
@@ -9,6 +10,10 @@ Contains:
 - User: represents students and instructors
 - Course: course metadata and instructor relation
 - Enrollment: association between students and courses
+- EnrollmentEvent: append-only log of enrollments and unenrollments
+- CourseEnrollmentDaily: per-course daily rollup of that log
+- RollupState: high-water marks of incremental rollups (see app.analytics)
+- Job: a durable background job (see app.jobs)
 """
 
 
@@ -36,12 +41,16 @@ class User(UserMixin, db.Model):
     # Relationships
     # -------------------------
 
+    # Deletes cascade in the database (ON DELETE CASCADE on the foreign
+    # keys); passive_deletes stops the ORM loading the children first
+
     # Instructor -> Courses created
     courses = db.relationship(
         "Course",
         backref="instructor",
         lazy=True,
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True
     )
 
     # Student -> Enrollments
@@ -49,7 +58,8 @@ class User(UserMixin, db.Model):
         "Enrollment",
         backref="student",
         lazy=True,
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True
     )
 
     def __repr__(self):
@@ -77,6 +87,13 @@ class Course(db.Model):
 
     __tablename__ = "course"
 
+    # Composite indexes backing the keyset-paginated catalog sorts
+    __table_args__ = (
+        db.Index("ix_course_title_id", "title", "id"),
+        db.Index("ix_course_instructor_id_id", "instructor_id", "id"),
+        db.Index("ix_course_enrollment_count_id", "enrollment_count", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     title = db.Column(db.String(200), nullable=False)
@@ -85,10 +102,22 @@ class Course(db.Model):
     # Thumbnail image URL
     thumbnail = db.Column(db.String(500))
 
+    # Uploaded thumbnail (see app.thumbnails); wins over `thumbnail`
+    thumbnail_key = db.Column(db.String(16))
+
+    # Denormalized number of Enrollment rows, maintained by the
+    # enroll/unenroll views (see app.counters)
+    enrollment_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0"
+    )
+
     # Foreign key -> instructor
     instructor_id = db.Column(
         db.Integer,
-        db.ForeignKey("user.id"),
+        db.ForeignKey("user.id", ondelete="CASCADE"),
         nullable=False
     )
 
@@ -96,12 +125,13 @@ class Course(db.Model):
     # Relationships
     # -------------------------
 
-    # Course -> Enrollments
+    # Course -> Enrollments (removed by ON DELETE CASCADE)
     enrollments = db.relationship(
         "Enrollment",
         backref="course",
         lazy=True,
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True
     )
 
     def __repr__(self):
@@ -114,6 +144,8 @@ class Course(db.Model):
         title: course title
         description: full course description
         thumbnail: image URL
+        thumbnail_key: storage key of the uploaded thumbnail, if any
+        enrollment_count: cached number of enrollments
         instructor_id: FK to User (instructor)
         enrollments: relationship to Enrollment
     """
@@ -130,22 +162,39 @@ class Enrollment(db.Model):
 
     __tablename__ = "enrollment"
 
+    # One row per (student, course); duplicates are rejected by the
+    # database so concurrent enroll requests cannot race
+    __table_args__ = (
+        db.Index(
+            "uq_enrollment_student_course",
+            "student_id",
+            "course_id",
+            unique=True
+        ),
+        # Course rosters: seek / stream one course's rows in id order
+        db.Index("ix_enrollment_course_id_id", "course_id", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     # Student who enrolled
     student_id = db.Column(
         db.Integer,
-        db.ForeignKey("user.id"),
+        db.ForeignKey("user.id", ondelete="CASCADE"),
         nullable=False
     )
 
     # Course enrolled into
     course_id = db.Column(
         db.Integer,
-        db.ForeignKey("course.id"),
+        db.ForeignKey("course.id", ondelete="CASCADE"),
         nullable=False
     )
 
+    # When the student enrolled (UTC); NULL for rows older than the
+    # column (see database.ensure_enrollment_created_at_column)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
     def __repr__(self):
         return f"<Enrollment student={self.student_id} course={self.course_id}>"
 
@@ -156,12 +205,208 @@ class Enrollment(db.Model):
         id: primary key
         student_id: FK to User
         course_id: FK to Course
+        created_at: enrollment time (UTC), if known
+    """
+
+
+# ==========================================================
+# ENROLLMENT EVENT MODEL
+# ==========================================================
+# Written with every enrollment change; unenrolling deletes the
+# Enrollment row but leaves its event behind
+# ==========================================================
+class EnrollmentEvent(db.Model):
+
+    __tablename__ = "enrollment_event"
+
+    # Rollups read the log in id order, past their high-water mark
+    id = db.Column(db.Integer, primary_key=True)
+
+    course_id = db.Column(
+        db.Integer,
+        db.ForeignKey("course.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    # Kept after the student is deleted; the history still counts
+    student_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="SET NULL")
+    )
+
+    # "enroll" or "unenroll"
+    kind = db.Column(db.String(10), nullable=False)
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=db.func.current_timestamp()
+    )
+
+    def __repr__(self):
+        return f"<EnrollmentEvent {self.kind} student={self.student_id} course={self.course_id}>"
+
+    """EnrollmentEvent model docstring.
+
+    Attributes:
+        id: primary key, increasing in commit order on SQLite
+        course_id: FK to Course
+        student_id: FK to User, NULL once the student is deleted
+        kind: 'enroll' or 'unenroll'
+        created_at: UTC timestamp
+    """
+
+
+# ==========================================================
+# COURSE ENROLLMENT DAILY ROLLUP
+# ==========================================================
+# One row per (course, UTC day) with activity; maintained from the
+# event log by app.analytics, read by the instructor dashboard
+# ==========================================================
+class CourseEnrollmentDaily(db.Model):
+
+    __tablename__ = "course_enrollment_daily"
+
+    course_id = db.Column(
+        db.Integer,
+        db.ForeignKey("course.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    day = db.Column(db.Date, primary_key=True)
+
+    enrolls = db.Column(db.Integer, nullable=False, default=0)
+    unenrolls = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CourseEnrollmentDaily course={self.course_id} {self.day}>"
+
+    """CourseEnrollmentDaily model docstring.
+
+    Attributes:
+        course_id: FK to Course (part of the primary key)
+        day: UTC date (part of the primary key)
+        enrolls / unenrolls: events of that kind on that day
+    """
+
+
+# ==========================================================
+# ROLLUP STATE
+# ==========================================================
+# High-water mark of each incremental rollup
+# ==========================================================
+class RollupState(db.Model):
+
+    __tablename__ = "rollup_state"
+
+    name = db.Column(db.String(50), primary_key=True)
+
+    # Id of the last source row folded into the rollup
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<RollupState {self.name} @{self.position}>"
+
+    """RollupState model docstring.
+
+    Attributes:
+        name: rollup name (primary key)
+        position: last source id already folded in
+        updated_at: when the rollup last caught up (UTC)
+    """
+
+
+# ==========================================================
+# JOB MODEL
+# ==========================================================
+# One row per background job; claimed and run by app.jobs workers
+# ==========================================================
+class Job(db.Model):
+
+    __tablename__ = "job"
+
+    # Workers claim the most urgent runnable job first
+    __table_args__ = (
+        db.Index("ix_job_status_priority_id", "status", "priority", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Registered task name and its JSON keyword arguments
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+
+    # queued -> running -> done | failed (or back to queued to retry)
+    status = db.Column(db.String(20), nullable=False, default="queued")
+
+    # Higher runs first
+    priority = db.Column(db.Integer, nullable=False, default=0)
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+
+    # Not claimed before this time (retry backoff, delayed jobs)
+    run_at = db.Column(db.DateTime, nullable=False)
+
+    # Worker holding the job and since when (stale leases are requeued)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+
+    # User who enqueued it; only they may read its status
+    owner_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="SET NULL")
+    )
+
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.name} {self.status}>"
+
+    """Job model docstring.
+
+    Attributes:
+        id: primary key
+        name: registered task name
+        payload: JSON-encoded keyword arguments
+        status: 'queued', 'running', 'done' or 'failed'
+        priority: higher values are claimed first
+        attempts / max_attempts: runs so far / allowed
+        run_at: earliest time the job may be claimed (UTC)
+        locked_by / locked_at: worker lease
+        last_error: traceback of the latest failure
+        result: JSON-encoded return value
+        owner_id: FK to User who enqueued it, if any
+        created_at / finished_at: UTC timestamps
     """
 
 
 # ==========================================================
 # FLASK-LOGIN USER LOADER
 # ==========================================================
+# Served from the identity cache; the database is only hit on a miss
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    user_id = int(user_id)
+
+    snapshot = identity_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+
+    return identity_cache.put(user)
+
+
+# Drop cached identities whenever the ORM changes a user record
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_identity(mapper, connection, user):
+    identity_cache.invalidate(user.id)
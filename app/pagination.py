@@ -0,0 +1,277 @@
+"""Keyset (cursor) pagination helpers.
+
+Pages are addressed by the sort key of the last row seen instead of an
+OFFSET, so fetching page N costs the same index seek as fetching page 1.
+The ORDER BY columns must end with a unique column (normally the primary
+key) so that ties are broken deterministically.
+"""
+
+import base64
+import json
+import math
+
+from sqlalchemy import and_, or_, tuple_
+
+
+DEFAULT_PER_PAGE = 24
+MAX_PER_PAGE = 100
+
+# Integers a cursor may carry: what a 64-bit INTEGER column can bind
+MIN_INT, MAX_INT = -2 ** 63, 2 ** 63 - 1
+
+# Dialects comparing row values, `(a, b) > (x, y)`, as a single index range
+ROW_VALUE_DIALECTS = ("sqlite", "postgresql", "mysql", "mariadb")
+
+
+# ----------------------------------
+# CURSOR ENCODING
+# ----------------------------------
+def encode_cursor(values):
+    """Encode a tuple of sort-key values as an opaque URL-safe token."""
+
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, size):
+    """Decode a token produced by `encode_cursor`.
+
+    Returns a list of `size` values, or None if the token is missing or
+    malformed (a bad cursor simply restarts from the first page). Only
+    scalars the database can bind are accepted: strings, booleans,
+    finite floats, None and 64-bit integers.
+    """
+
+    if not token:
+        return None
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(values, list) or len(values) != size:
+        return None
+
+    if not all(_bindable(value) for value in values):
+        return None
+
+    return values
+
+
+def _bindable(value):
+    if isinstance(value, bool) or value is None:
+        return True
+    if isinstance(value, int):
+        return MIN_INT <= value <= MAX_INT
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, str)
+
+
+def parse_per_page(value, default=DEFAULT_PER_PAGE):
+    """Clamp a `per_page` query argument to [1, MAX_PER_PAGE]."""
+
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+# ----------------------------------
+# PAGE OBJECT
+# ----------------------------------
+class KeysetPage:
+    """One page of results plus the cursors needed to move around."""
+
+    def __init__(self, items, next_cursor, prev_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# ----------------------------------
+# PAGINATION
+# ----------------------------------
+def _seek(columns, values, descending, dialect=None):
+    """Return a WHERE clause selecting rows strictly past `values`.
+
+    On `ROW_VALUE_DIALECTS` this is the row comparison `(a, b) > (x, y)`,
+    which the planner turns into one range seek on a composite index over
+    the same columns. Elsewhere it is expanded into
+    `a >= x AND (a > x OR (a = x AND b > y))`: planners do not seek an OR
+    of bound parameters (SQLite scans the index), so the redundant
+    leading conjunct is what bounds the range.
+    """
+
+    if len(columns) > 1 and dialect in ROW_VALUE_DIALECTS:
+        row, past = tuple_(*columns), tuple_(*values)
+        return row < past if descending else row > past
+
+    clauses = []
+
+    for i, column in enumerate(columns):
+        past = column < values[i] if descending else column > values[i]
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, past))
+
+    if len(columns) == 1:
+        return clauses[0]
+
+    leading = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    return and_(leading, or_(*clauses))
+
+
+def _fetch(query, columns, seek, reverse, limit):
+    # Up to `limit` rows of `query` past `seek` (None: from the start)
+    if seek is not None:
+        # With the SELECT as clause, RoutingSession does not take the
+        # lookup for a write and pin the request to the primary
+        dialect = query.session.get_bind(clause=query.statement).dialect.name
+        query = query.filter(_seek(columns, seek, reverse, dialect))
+
+    query = query.order_by(
+        *[column.desc() if reverse else column.asc() for column in columns]
+    )
+
+    return query.limit(limit).all()
+
+
+def _page(rows, per_page, backwards, resumed, cursor):
+    # Trim the `per_page + 1` rows read into a KeysetPage;
+    # `cursor(i, items)` encodes the token of the page's items[i]
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+
+    if rows:
+        first, last = cursor(0, rows), cursor(len(rows) - 1, rows)
+
+        if backwards:
+            prev_cursor = first if more else None
+            next_cursor = last
+        else:
+            next_cursor = last if more else None
+            prev_cursor = first if resumed else None
+
+    return KeysetPage(rows, next_cursor, prev_cursor, per_page)
+
+
+def keyset_paginate(query, columns, key, descending=False,
+                    after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of `query` ordered by `columns`.
+
+    Args:
+        query: an un-ordered SQLAlchemy query.
+        columns: ORDER BY expressions; the last one must be unique.
+        key: callable returning the tuple of values for `columns` from a
+            result row.
+        descending: order every column descending instead of ascending.
+        after: cursor token of the row preceding the wanted page.
+        before: cursor token of the row following the wanted page.
+        per_page: number of rows per page.
+
+    Only `per_page + 1` rows are ever read, so the cost is independent
+    of how deep into the result set the page is.
+    """
+
+    after_values = decode_cursor(after, len(columns))
+    before_values = decode_cursor(before, len(columns))
+
+    # Walking backwards: flip the order, seek past `before`, then
+    # reverse the rows so the page still reads in the requested order.
+    backwards = before_values is not None and after_values is None
+    reverse = descending != backwards
+
+    seek = before_values if backwards else after_values
+    rows = _fetch(query, columns, seek, reverse, per_page + 1)
+
+    return _page(
+        rows, per_page, backwards, after_values is not None,
+        lambda i, items: encode_cursor(key(items[i]))
+    )
+
+
+def _decode_position(token, columns, segments):
+    # [segment, *values] of a segmented cursor, or None if invalid
+    position = decode_cursor(token, len(columns) + 1)
+
+    if position is None or not isinstance(position[0], int) \
+            or not 0 <= position[0] < len(segments):
+        return None
+
+    return position
+
+
+def keyset_paginate_segments(segments, columns, key, descending=False,
+                             after=None, before=None,
+                             per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of the queries `segments`, read one after another.
+
+    Like `keyset_paginate`, but the result is every row of
+    `segments[0]`, then every row of `segments[1]`, and so on, each
+    ordered by `columns`. The segments must not overlap. Each is
+    paginated on its own keyset, so a composite index on `columns`
+    drives every one of them; a single ORDER BY on a "which segment"
+    expression could not use it. Cursors carry the segment they point
+    into. A page spanning a boundary reads from both segments, still
+    `per_page + 1` rows in all.
+    """
+
+    after_position = _decode_position(after, columns, segments)
+    before_position = _decode_position(before, columns, segments)
+
+    backwards = before_position is not None and after_position is None
+    reverse = descending != backwards
+
+    position = before_position if backwards else after_position
+
+    if position is None:
+        order = range(len(segments))
+    elif backwards:
+        order = range(position[0], -1, -1)
+    else:
+        order = range(position[0], len(segments))
+
+    rows = []
+    where = []
+
+    for index in order:
+        seek = position[1:] if position and index == position[0] else None
+        fetched = _fetch(segments[index], columns, seek, reverse,
+                         per_page + 1 - len(rows))
+        rows.extend(fetched)
+        where.extend([index] * len(fetched))
+
+        if len(rows) > per_page:
+            break
+
+    if backwards:
+        where = where[:per_page][::-1]
+
+    return _page(
+        rows, per_page, backwards, after_position is not None,
+        lambda i, items: encode_cursor([where[i], *key(items[i])])
+    )
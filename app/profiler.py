@@ -0,0 +1,305 @@
+"""On-demand, per-request sampling profiler.
+
+A request is profiled only when it asks for it, in one of two ways:
+
+- `?profile=1` from a logged-in user listed in `PROFILER_ADMINS`;
+- an `X-Profile-Token` header carrying a token signed with the app's
+  `SECRET_KEY`, issued to an admin with `flask --app run profiler-token
+  <username>` (valid for `PROFILER_TOKEN_MAX_AGE` seconds).
+
+While the view runs, a background thread samples the request thread's
+call stack every `PROFILER_INTERVAL` seconds and every SQL statement is
+recorded with its parameters and duration. Afterwards three files are
+written to `PROFILER_DIR`:
+
+- `<id>.speedscope.json`: open at https://www.speedscope.app;
+- `<id>.folded`: folded stacks for flamegraph.pl / inferno;
+- `<id>.sql.json`: the statements issued, in order.
+
+The id is returned in the `X-Profile-Id` response header. Requests that
+do not ask are untouched apart from one header/argument lookup, and the
+SQL hook returns immediately unless a profile is running.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from flask import current_app, g, request
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_SALT = "lms-profiler"
+
+# Number of requests currently being profiled in this process; the SQL
+# hook is a no-op while it is zero
+_active = 0
+_active_lock = threading.Lock()
+
+
+# ----------------------------------
+# SAMPLER
+# ----------------------------------
+class Sampler(threading.Thread):
+    """Samples the call stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="lms-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+
+            stack.reverse()
+            self.samples.append((tuple(stack), now - last))
+            last = now
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+# ----------------------------------
+# OUTPUT FORMATS
+# ----------------------------------
+def to_speedscope(name, samples):
+    """Return a speedscope "sampled" profile document."""
+
+    frames = []
+    index = {}
+    stacks = []
+    weights = []
+
+    for stack, weight in samples:
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            ids.append(index[frame])
+        stacks.append(ids)
+        weights.append(weight)
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "lms-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": stacks,
+            "weights": weights,
+        }],
+    }
+
+
+def to_folded(samples):
+    """Return folded stacks ("a;b;c <microseconds>") for flamegraph tools."""
+
+    totals = {}
+
+    for stack, weight in samples:
+        key = ";".join(
+            f"{name} ({os.path.basename(filename)}:{line})"
+            for name, filename, line in stack
+        )
+        totals[key] = totals.get(key, 0) + weight
+
+    return "".join(
+        f"{key} {max(1, round(weight * 1e6))}\n" for key, weight in totals.items()
+    )
+
+
+# ----------------------------------
+# EXTENSION
+# ----------------------------------
+class Profiler:
+    """Flask extension wiring the profiler into the request cycle."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PROFILER_ENABLED", True)
+        app.config.setdefault("PROFILER_ADMINS", ())
+        app.config.setdefault("PROFILER_DIR", None)
+        app.config.setdefault("PROFILER_INTERVAL", 0.001)
+        app.config.setdefault("PROFILER_TOKEN_MAX_AGE", 3600)
+
+        app.extensions["profiler"] = self
+
+        if not app.config["PROFILER_ENABLED"]:
+            return
+
+        if not app.config["PROFILER_DIR"]:
+            app.config["PROFILER_DIR"] = os.path.join(app.instance_path, "profiles")
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor):
+            event.listen(Engine, "before_cursor_execute", _before_cursor)
+            event.listen(Engine, "after_cursor_execute", _after_cursor)
+
+    # ----------------------------------
+    # AUTHORIZATION
+    # ----------------------------------
+    @staticmethod
+    def _serializer():
+        return URLSafeTimedSerializer(
+            current_app.config["SECRET_KEY"], salt=TOKEN_SALT
+        )
+
+    def issue_token(self, username):
+        """Return a signed profiling token for an admin `username`."""
+
+        if username not in current_app.config["PROFILER_ADMINS"]:
+            raise ValueError(f"{username} is not listed in PROFILER_ADMINS")
+
+        return self._serializer().dumps(username)
+
+    def _requested(self):
+        token = request.headers.get(TOKEN_HEADER)
+
+        if token:
+            try:
+                username = self._serializer().loads(
+                    token, max_age=current_app.config["PROFILER_TOKEN_MAX_AGE"]
+                )
+            except BadSignature:
+                return False
+            return username in current_app.config["PROFILER_ADMINS"]
+
+        if request.args.get("profile") == "1":
+            return (
+                current_user.is_authenticated
+                and current_user.username in current_app.config["PROFILER_ADMINS"]
+            )
+
+        return False
+
+    # ----------------------------------
+    # REQUEST HOOKS
+    # ----------------------------------
+    def _before_request(self):
+        global _active
+
+        # Fast path: nothing asked for a profile
+        if TOKEN_HEADER not in request.headers and "profile" not in request.args:
+            return
+
+        if not self._requested():
+            return
+
+        sampler = Sampler(threading.get_ident(), current_app.config["PROFILER_INTERVAL"])
+        g.profile = {"sampler": sampler, "sql": [], "start": time.perf_counter()}
+
+        with _active_lock:
+            _active += 1
+
+        sampler.start()
+
+    @staticmethod
+    def _finish(state):
+        global _active
+
+        state["sampler"].stop()
+
+        with _active_lock:
+            _active -= 1
+
+        return time.perf_counter() - state["start"]
+
+    def _after_request(self, response):
+        state = g.pop("profile", None)
+        if state is None:
+            return response
+
+        elapsed = self._finish(state)
+
+        profile_id = "{}-{}-{}".format(
+            time.strftime("%Y%m%dT%H%M%S"),
+            request.endpoint or "unmatched",
+            os.urandom(3).hex()
+        )
+        name = f"{request.method} {request.full_path.rstrip('?')}"
+        self._write(profile_id, name, elapsed, state)
+
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    def _teardown_request(self, exc):
+        # The view raised before after_request could stop the sampler
+        state = g.pop("profile", None)
+        if state is not None:
+            self._finish(state)
+
+    def _write(self, profile_id, name, elapsed, state):
+        directory = current_app.config["PROFILER_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile_id)
+        samples = state["sampler"].samples
+
+        with open(base + ".speedscope.json", "w") as fh:
+            json.dump(to_speedscope(name, samples), fh)
+
+        with open(base + ".folded", "w") as fh:
+            fh.write(to_folded(samples))
+
+        with open(base + ".sql.json", "w") as fh:
+            json.dump({
+                "request": name,
+                "elapsed_s": elapsed,
+                "samples": len(samples),
+                "statements": state["sql"],
+            }, fh, indent=2, default=repr)
+
+
+# ----------------------------------
+# ENGINE EVENTS
+# ----------------------------------
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if _active:
+        conn.info["profile_start"] = time.perf_counter()
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    if not _active:
+        return
+
+    started = conn.info.pop("profile_start", None)
+    state = g.get("profile") if started is not None else None
+    if state is None:
+        return
+
+    state["sql"].append({
+        "statement": " ".join(statement.split()),
+        "parameters": parameters,
+        "duration_s": time.perf_counter() - started,
+        "executemany": executemany,
+    })
@@ -0,0 +1,107 @@
+"""Read/write splitting across a primary and optional read replicas.
+
+Set `DATABASE_REPLICA_URLS` (comma separated) to register one bind per
+replica (`replica0`, `replica1`, ...; see `database.configure`). `db`
+then uses `RoutingSession`, which sends a statement to a replica only
+when all of these hold:
+
+- it runs inside a GET/HEAD request;
+- it is a plain SELECT (not a flush, DML or raw SQL);
+- nothing has been written in this request yet, and the user has not
+  written within the last `REPLICA_STICKY_SECONDS` (so a redirect after
+  a write still reads its own data from the primary).
+
+Everything else, including CLI commands and scripts, uses the primary.
+Each request sticks to one randomly chosen replica.
+
+Locally, two SQLite files can stand in for primary and replica:
+
+    DATABASE_URL=sqlite:///lms.db \
+    DATABASE_REPLICA_URLS=sqlite:///lms-replica.db \
+    flask --app run sync-replicas
+"""
+
+import random
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select
+
+
+STICKY_KEY = "_primary_until"
+
+
+def replica_keys(app):
+    """Bind keys of the configured replicas."""
+
+    return [key for key in app.config.get("SQLALCHEMY_BINDS", {})
+            if key.startswith("replica")]
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session routing safe reads to a replica."""
+
+    def _replica(self):
+        """Return this session's replica engine, or None without replicas."""
+
+        keys = self.info.get("replica_keys")
+
+        if keys is None:
+            keys = self.info["replica_keys"] = [
+                key for key in self._db.engines
+                if isinstance(key, str) and key.startswith("replica")
+            ]
+
+        if not keys:
+            return None
+
+        if "replica" not in self.info:
+            self.info["replica"] = random.choice(keys)
+
+        return self._db.engines[self.info["replica"]]
+
+    def _reads_from_replica(self, clause):
+        if not isinstance(clause, Select) or self._flushing:
+            return False
+
+        if not has_request_context() or request.method not in ("GET", "HEAD"):
+            return False
+
+        if g.get("db_wrote"):
+            return False
+
+        return session.get(STICKY_KEY, 0) < time.time()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            replica = self._replica()
+
+            if replica is not None:
+                if self._reads_from_replica(clause):
+                    return replica
+
+                # Anything else sent to the primary may write; keep the
+                # rest of the request (and the user's next ones) there
+                if not isinstance(clause, Select):
+                    g.db_wrote = True
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _remember_write(response):
+    sticky = current_app.config["REPLICA_STICKY_SECONDS"]
+
+    if g.get("db_wrote") and sticky:
+        session[STICKY_KEY] = time.time() + sticky
+
+    return response
+
+
+def init_app(app):
+    """Register the cross-request stickiness hook when replicas exist."""
+
+    app.config.setdefault("REPLICA_STICKY_SECONDS", 5)
+
+    if replica_keys(app):
+        app.after_request(_remember_write)
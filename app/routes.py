@@ -1,10 +1,22 @@
+import io
+
 from flask import render_template, flash, redirect, url_for, request, Blueprint
+from flask import Response, abort, jsonify, stream_with_context
 from flask_login import current_user, login_required
-from sqlalchemy import asc, desc
-
-from .models import Course, Enrollment, User
-from . import db
+from sqlalchemy import and_, exists, literal, select
+from .models import Course, Enrollment, Job, User
+from . import analytics, db, jobs, loaders, thumbnails
+from .bulk import import_enrollments, read_enrollment_csv, write_report
+from .enrollments import UnknownCourse, enroll_student, unenroll_student
+from .fragments import (
+    catalog_page, course_cards, invalidate_cards, invalidate_listings,
+    viewer_page
+)
 from .decorators import role_required
+from .pagination import keyset_paginate, keyset_paginate_segments, parse_per_page
+from .roster import roster_page, stream_csv, stream_jsonl
+from .search import highlight, search_courses
+from .thumbnails import ThumbnailError
 
 
 """Main application routes.
@@ -21,67 +33,218 @@ its purpose and expected template variables.
 # ----------------------------------
 main = Blueprint("main", __name__)
 
+# `{{ row.title_hl|highlight }}` renders search matches as <mark>
+main.add_app_template_filter(highlight, "highlight")
+
+
+# ----------------------------------
+# CATALOG QUERIES
+# ----------------------------------
+def _sort_column(sort_by):
+    """ORDER BY expression for a catalog sort (before the Course.id tie-break)."""
+
+    if sort_by == "popularity":
+        return Course.enrollment_count
+    if sort_by == "instructor":
+        return User.username
+    return Course.title
+
+
+def _viewer_courses(query):
+    """Split `query` into (the viewer's own courses, the rest), or None.
+
+    Students own the courses they are enrolled in, instructors the
+    courses they teach. Anonymous viewers get the shared catalog.
+    """
+
+    if not current_user.is_authenticated:
+        return None
+
+    if current_user.role == "student":
+        enrolled = and_(
+            Enrollment.course_id == Course.id,
+            Enrollment.student_id == current_user.id
+        )
+        # The JOIN lets the planner start from the student's enrollments
+        return (
+            query.join(Enrollment, enrolled),
+            query.filter(~exists().where(enrolled))
+        )
+
+    if current_user.role == "instructor":
+        own = Course.instructor_id == current_user.id
+        return query.filter(own), query.filter(~own)
+
+    return None
+
+
+def _shared_catalog_page(sort_by, order, per_page):
+    """The viewer-independent catalog page, through the fragment cache."""
+
+    column = _sort_column(sort_by)
+
+    def fetch():
+        return keyset_paginate(
+            loaders.cards(column.label("sort_key")),
+            (column, Course.id),
+            lambda row: (row.sort_key, row.id),
+            descending=(order == "desc"),
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+            per_page=per_page
+        )
+
+    return catalog_page(
+        sort_by,
+        order,
+        per_page,
+        request.args.get("after"),
+        request.args.get("before"),
+        fetch
+    )
+
+
+def _personal_catalog_page(sort_by, order, per_page):
+    """One catalog page with the viewer's own courses first, or None.
+
+    The own courses and the rest are paginated as two segments, each
+    seeking (sort column, id) on its own index, and the cursor records
+    the segment. Rows carry `id`, `instructor_id` and `mine` only, the
+    cards come from the fragment cache. Returns None when the viewer
+    gets the shared catalog (see `_viewer_courses`).
+    """
+
+    column = _sort_column(sort_by)
+
+    query = db.session.query(
+        Course.id,
+        Course.instructor_id,
+        column.label("sort_key")
+    )
+
+    if sort_by == "instructor":
+        query = query.join(User, Course.instructor_id == User.id)
+
+    segments = _viewer_courses(query)
+
+    if segments is None:
+        return None
+
+    mine, rest = segments
+
+    return keyset_paginate_segments(
+        (
+            mine.add_columns(literal(True).label("mine")),
+            rest.add_columns(literal(False).label("mine"))
+        ),
+        (column, Course.id),
+        lambda row: (row.sort_key, row.id),
+        descending=(order == "desc"),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page
+    )
+
 
 # ----------------------------------
 # HOME (GRID + SORT + PRIORITY LOGIC)
 # ----------------------------------
 @main.route("/")
 def home():
-    """Render the home page with course listing.
+    """Render the home page with one keyset-paginated page of courses.
 
     Template: `index.html`
+    Query args: sort (title|instructor|popularity), order (asc|desc), per_page,
+        after / before (opaque page cursors)
     Context:
-        courses: list of Course
-        enrolled_course_ids: list of course ids for current student
-        sort_by, order: sorting options
+        courses: list of CatalogCard (id, instructor_id, cached html)
+        page: CachedPage with next/prev cursors
+        enrolled_course_ids: set of this page's course ids the current
+            student is enrolled in
+        sort_by, order, per_page: sorting and paging options
     """
 
     sort_by = request.args.get("sort", "title")
     order = request.args.get("order", "asc")
+    per_page = parse_per_page(request.args.get("per_page"))
 
-    query = Course.query
+    if sort_by not in ("title", "instructor", "popularity"):
+        sort_by = "title"
+    if order not in ("asc", "desc"):
+        order = "asc"
 
-    # Apply sorting
-    if sort_by == "title":
-        query = query.order_by(
-            asc(Course.title) if order == "asc"
-            else desc(Course.title)
-        )
+    personal = _personal_catalog_page(sort_by, order, per_page)
+    enrolled_course_ids = set()
 
-    elif sort_by == "instructor":
-        query = query.join(User).order_by(
-            asc(User.username) if order == "asc"
-            else desc(User.username)
-        )
+    if personal is None:
+        page = _shared_catalog_page(sort_by, order, per_page)
+    else:
+        page = viewer_page(personal)
 
-    courses = query.all()
+        if current_user.role == "student":
+            enrolled_course_ids = {row.id for row in personal if row.mine}
 
-    enrolled_course_ids = []
+    courses = course_cards(
+        page,
+        lambda ids: loaders.cards().filter(Course.id.in_(ids)).all()
+    )
 
-    # Student: enrolled courses first
-    if current_user.is_authenticated and current_user.role == "student":
-        enrollments = Enrollment.query.filter_by(
-            student_id=current_user.id
-        ).all()
+    return render_template(
+        "index.html",
+        courses=courses,
+        page=page,
+        enrolled_course_ids=enrolled_course_ids,
+        sort_by=sort_by,
+        order=order,
+        per_page=per_page
+    )
 
-        enrolled_course_ids = [e.course_id for e in enrollments]
 
-        courses.sort(
-            key=lambda c: c.id not in enrolled_course_ids
-        )
+# ----------------------------------
+# FULL-TEXT SEARCH
+# ----------------------------------
+@main.route("/search")
+def search():
+    """Render ranked, highlighted full-text search results.
 
-    # Instructor: own courses first
-    if current_user.is_authenticated and current_user.role == "instructor":
-        courses.sort(
-            key=lambda c: c.instructor_id != current_user.id
-        )
+    Template: `search.html`
+    Query args: q, per_page, after / before (opaque page cursors)
+    Context:
+        q: the search text
+        page: KeysetPage of rows (id, instructor_id, instructor_name, rank,
+            title_hl, excerpt_hl), or None when `q` has no searchable terms
+        enrolled_course_ids: set of this page's course ids the current
+            student is enrolled in
+        per_page: page size
+    """
+
+    q = request.args.get("q", "").strip()
+    per_page = parse_per_page(request.args.get("per_page"))
+
+    page = search_courses(
+        q,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page
+    )
+
+    enrolled_course_ids = set()
+
+    if page and current_user.is_authenticated and current_user.role == "student":
+        # Only this page's courses, read from the (student, course) index
+        enrolled_course_ids = set(db.session.execute(
+            select(Enrollment.course_id).where(
+                Enrollment.student_id == current_user.id,
+                Enrollment.course_id.in_([row.id for row in page])
+            )
+        ).scalars())
 
     return render_template(
-        "index.html",
-        courses=courses,
+        "search.html",
+        q=q,
+        page=page,
         enrolled_course_ids=enrolled_course_ids,
-        sort_by=sort_by,
-        order=order
+        per_page=per_page
     )
 
 
@@ -95,21 +258,38 @@ def create_course():
     """Instructor-only: create a new course.
 
     Template: `create_course.html`
+    An uploaded thumbnail is stored now; its resized variants are
+    rendered in the background (see `app.thumbnails`).
     """
 
     if request.method == "POST":
         title = request.form.get("title")
         description = request.form.get("description")
 
+        try:
+            thumbnail_key = thumbnails.store_upload(request.files.get("thumbnail"))
+        except ThumbnailError as exc:
+            flash(str(exc))
+            return render_template("create_course.html")
+
         new_course = Course(
             title=title,
             description=description,
+            thumbnail_key=thumbnail_key,
             instructor_id=current_user.id
         )
 
         db.session.add(new_course)
+
+        # Rendered by a job, committed together with the course
+        if thumbnail_key:
+            thumbnails.submit(thumbnail_key, owner_id=current_user.id)
+
         db.session.commit()
 
+        # A new course can land on any page of every sort
+        invalidate_listings()
+
         flash("Course created successfully!")
         return redirect(url_for("main.home"))
 
@@ -136,10 +316,28 @@ def edit_course(course_id):
         return redirect(url_for("main.home"))
 
     if request.method == "POST":
-        course.title = request.form.get("title")
+        try:
+            thumbnail_key = thumbnails.store_upload(request.files.get("thumbnail"))
+        except ThumbnailError as exc:
+            flash(str(exc))
+            return render_template("edit_course.html", course=course)
+
+        title = request.form.get("title")
+        title_changed = title != course.title
+
+        course.title = title
         course.description = request.form.get("description")
 
+        if thumbnail_key:
+            course.thumbnail_key = thumbnail_key
+            thumbnails.submit(thumbnail_key, owner_id=current_user.id)
+
         db.session.commit()
+
+        # Only the title sort depends on edited fields
+        invalidate_cards(course.id)
+        if title_changed:
+            invalidate_listings("title")
         flash("Course updated successfully!")
         return redirect(url_for("main.home"))
 
@@ -153,7 +351,13 @@ def edit_course(course_id):
 @login_required
 @role_required("instructor")
 def delete_course(course_id):
-    """Instructor-only: delete a course owned by the instructor."""
+    """Instructor-only: delete a course owned by the instructor.
+
+    A single DELETE: the enrollments are removed by ON DELETE CASCADE
+    (the relationship uses passive_deletes, so none are loaded). The
+    course row carries its own enrollment counter, so every remaining
+    counter stays correct.
+    """
 
     course = Course.query.get_or_404(course_id)
 
@@ -164,6 +368,9 @@ def delete_course(course_id):
     db.session.delete(course)
     db.session.commit()
 
+    invalidate_cards(course_id)
+    invalidate_listings()
+
     flash("Course deleted successfully!")
     return redirect(url_for("main.home"))
 
@@ -178,22 +385,40 @@ def instructor_dashboard():
     """Instructor dashboard showing summary cards and course list.
 
     Template: `dashboard.html`
-    Context: courses, total_courses, total_students
+    Context: courses (card rows, see `loaders.cards`), total_courses,
+        total_students, trends (see `analytics.course_trends`),
+        period_days, changes (percent change per trend total, or None)
     """
 
-    courses = Course.query.filter_by(
-        instructor_id=current_user.id
-    ).all()
+    courses = loaders.cards().filter(
+        Course.instructor_id == current_user.id
+    ).order_by(Course.id).all()
 
     total_courses = len(courses)
 
-    total_students = sum(len(course.enrollments) for course in courses)
+    # Maintained counters; never touches the enrollment table
+    total_students = sum(course.enrollment_count for course in courses)
+
+    # Daily rollup only; never scans enrollment rows or events
+    trends = analytics.course_trends(current_user.id)
+    current, previous = trends.current, trends.previous
+    changes = {
+        "enrolls": analytics.change(current.enrolls, previous.enrolls),
+        "unenrolls": analytics.change(current.unenrolls, previous.unenrolls),
+        "net": analytics.change(
+            current.enrolls - current.unenrolls,
+            previous.enrolls - previous.unenrolls
+        ),
+    }
 
     return render_template(
         "dashboard.html",
         courses=courses,
         total_courses=total_courses,
-        total_students=total_students
+        total_students=total_students,
+        trends=trends,
+        period_days=analytics.PERIOD_DAYS,
+        changes=changes
     )
 
 
@@ -204,19 +429,128 @@ def instructor_dashboard():
 @login_required
 @role_required("instructor")
 def course_students(course_id):
-    """Show students enrolled in a specific course.
+    """Show one keyset-paginated page of students enrolled in a course.
 
     Template: `course_students.html`
-    Context: course (with enrollments)
+    Query args: per_page, after / before (opaque page cursors)
+    Context:
+        course: the Course
+        page: KeysetPage of (enrollment_id, student_id, username, email) rows
+        per_page: page size
     """
 
-    course = Course.query.get_or_404(course_id)
+    course = db.get_or_404(Course, course_id)
+
+    if course.instructor_id != current_user.id:
+        flash("Access denied!")
+        return redirect(url_for("main.instructor_dashboard"))
+
+    per_page = parse_per_page(request.args.get("per_page"), default=50)
+
+    page = roster_page(
+        course_id,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page
+    )
+
+    return render_template(
+        "course_students.html",
+        course=course,
+        page=page,
+        per_page=per_page
+    )
+
+
+# ----------------------------------
+# COURSE ROSTER EXPORT (Instructor)
+# ----------------------------------
+ROSTER_EXPORTS = {
+    "csv": (stream_csv, "text/csv"),
+    "jsonl": (stream_jsonl, "application/x-ndjson"),
+}
+
+
+@main.route("/course/<int:course_id>/students.<any(csv, jsonl):fmt>")
+@login_required
+@role_required("instructor")
+def export_course_students(course_id, fmt):
+    """Stream the full roster of a course as CSV or JSON Lines.
+
+    Rows are read from the database in chunks while the response is
+    being sent, so the roster is never held in memory.
+    """
+
+    course = db.get_or_404(Course, course_id)
 
     if course.instructor_id != current_user.id:
         flash("Access denied!")
-        return redirect(url_for("main.dashboard"))
+        return redirect(url_for("main.instructor_dashboard"))
+
+    stream, mimetype = ROSTER_EXPORTS[fmt]
+
+    return Response(
+        stream_with_context(stream(course_id)),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition":
+                f'attachment; filename="course-{course_id}-students.{fmt}"'
+        }
+    )
+
+
+# ----------------------------------
+# BULK ENROLLMENT IMPORT (Instructor)
+# ----------------------------------
+@main.route("/enrollments/import", methods=["GET", "POST"])
+@login_required
+@role_required("instructor")
+def import_enrollments_view():
+    """Enroll students into the instructor's courses from a CSV upload.
+
+    Template: `import_enrollments.html` (GET)
+    POST expects a `file` of `email,course_id` rows and responds with a
+    per-row CSV report; rows naming other instructors' courses are
+    reported as `not_course_owner` and skipped.
+    """
+
+    if request.method == "GET":
+        return render_template("import_enrollments.html")
+
+    upload = request.files.get("file")
+
+    if upload is None or not upload.filename:
+        flash("Choose a CSV file to import.")
+        return redirect(url_for("main.import_enrollments_view"))
+
+    text = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+
+    # Decode the whole file before the first chunk is committed
+    try:
+        for _ in text:
+            pass
+    except UnicodeDecodeError:
+        flash("The file is not UTF-8 text; save the CSV as UTF-8 and retry.")
+        return redirect(url_for("main.import_enrollments_view"))
+
+    text.seek(0)
+    rows = read_enrollment_csv(text)
+    report = io.StringIO()
+    summary = write_report(
+        import_enrollments(rows, instructor_id=current_user.id), report
+    )
 
-    return render_template("course_students.html", course=course)
+    return Response(
+        report.getvalue(),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition":
+                'attachment; filename="enrollment-import-report.csv"',
+            "X-Import-Summary": ", ".join(
+                f"{status}={count}" for status, count in sorted(summary.items())
+            ),
+        }
+    )
 
 
 # ----------------------------------
@@ -226,24 +560,25 @@ def course_students(course_id):
 @login_required
 @role_required("student")
 def enroll(course_id):
-    """Student-only: enroll the current user into a course."""
+    """Student-only: enroll the current user into a course.
+
+    A single INSERT ... ON CONFLICT DO NOTHING; the unique index on
+    (student_id, course_id) decides whether this is a duplicate, the
+    course foreign key whether the course exists (404 otherwise).
+    """
 
-    existing = Enrollment.query.filter_by(
-        student_id=current_user.id,
-        course_id=course_id
-    ).first()
+    try:
+        enrolled = enroll_student(current_user.id, course_id)
+    except UnknownCourse:
+        db.session.rollback()
+        abort(404)
 
-    if existing:
+    if not enrolled:
         flash("Already enrolled!")
         return redirect(url_for("main.home"))
 
-    enrollment = Enrollment(
-        student_id=current_user.id,
-        course_id=course_id
-    )
-
-    db.session.add(enrollment)
     db.session.commit()
+    invalidate_listings("popularity")
 
     flash("Enrolled successfully!")
     return redirect(url_for("main.home"))
@@ -259,16 +594,14 @@ def student_dashboard():
     """Student dashboard listing current user's enrollments.
 
     Template: `student_dashboard.html`
-    Context: enrollments
+    Context: courses (rows of id, title, description, instructor_name)
     """
 
-    enrollments = Enrollment.query.filter_by(
-        student_id=current_user.id
-    ).all()
+    courses = loaders.enrolled_courses(current_user.id).all()
 
     return render_template(
         "student_dashboard.html",
-        enrollments=enrollments
+        courses=courses
     )
 
 
@@ -281,22 +614,35 @@ def student_dashboard():
 def unenroll(course_id):
     """Student-only: remove enrollment for current user and course."""
 
-    # Find enrollment
-    enrollment = Enrollment.query.filter_by(
-        student_id=current_user.id,
-        course_id=course_id
-    ).first()
-
-    # Delete only if exists
-    if enrollment:
-        db.session.delete(enrollment)
+    # Delete only if exists (single DELETE statement)
+    if unenroll_student(current_user.id, course_id):
         db.session.commit()
+        invalidate_listings("popularity")
         flash("Unenrolled successfully!")
 
     # Always go back to student dashboard
     return redirect(url_for("main.student_dashboard"))
 
 
+# ----------------------------------
+# BACKGROUND JOB STATUS
+# ----------------------------------
+@main.route("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    """JSON status of a background job the current user enqueued.
+
+    Poll it after a view reported the job; other users' jobs are 404.
+    """
+
+    job = db.session.get(Job, job_id)
+
+    if job is None or job.owner_id != current_user.id:
+        abort(404)
+
+    return jsonify(jobs.describe(job))
+
+
 # ----------------------------------
 # TEST ROUTE
 # ----------------------------------
@@ -0,0 +1,202 @@
+"""Full-text course search.
+
+On SQLite the catalog is indexed by an external-content FTS5 table,
+`course_fts`, over `course.title` and `course.description`. Triggers on
+`course` keep it in step with every insert, update and delete, so
+`create_course`, `edit_course` and `delete_course` update the index in
+the same transaction as the row itself.
+
+On Postgres (`DATABASE_URL=postgresql://...`) the same API is served by
+a stored, generated `tsvector` column with a GIN index.
+
+Results are ranked (title matches weigh more than description matches),
+highlighted, and paged with the same keyset cursors as the catalog.
+"""
+
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, Float, Integer, String, event, text
+
+from . import db
+from .models import Course, User
+from .pagination import DEFAULT_PER_PAGE, keyset_paginate
+
+
+# Sentinels wrapped around matches by the database; swapped for <mark>
+# only after the surrounding text has been HTML-escaped.
+_OPEN = "\x02"
+_CLOSE = "\x03"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+# ----------------------------------
+# SCHEMA
+# ----------------------------------
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS course_fts USING fts5("
+    " title, description, content='course', content_rowid='id',"
+    " tokenize='porter unicode61')",
+
+    "CREATE TRIGGER IF NOT EXISTS course_fts_ai AFTER INSERT ON course BEGIN"
+    " INSERT INTO course_fts(rowid, title, description)"
+    " VALUES (new.id, new.title, new.description);"
+    " END",
+
+    "CREATE TRIGGER IF NOT EXISTS course_fts_ad AFTER DELETE ON course BEGIN"
+    " INSERT INTO course_fts(course_fts, rowid, title, description)"
+    " VALUES ('delete', old.id, old.title, old.description);"
+    " END",
+
+    "CREATE TRIGGER IF NOT EXISTS course_fts_au"
+    " AFTER UPDATE OF title, description ON course BEGIN"
+    " INSERT INTO course_fts(course_fts, rowid, title, description)"
+    " VALUES ('delete', old.id, old.title, old.description);"
+    " INSERT INTO course_fts(rowid, title, description)"
+    " VALUES (new.id, new.title, new.description);"
+    " END",
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE course ADD COLUMN IF NOT EXISTS search_vector tsvector"
+    " GENERATED ALWAYS AS ("
+    " setweight(to_tsvector('english', coalesce(title, '')), 'A') ||"
+    " setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+    ") STORED",
+
+    "CREATE INDEX IF NOT EXISTS ix_course_search_vector"
+    " ON course USING GIN (search_vector)",
+]
+
+
+def _attach_ddl():
+    """Create the search index whenever `db.create_all()` creates `course`."""
+
+    for statement in SQLITE_DDL:
+        event.listen(
+            Course.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect="sqlite")
+        )
+
+    for statement in POSTGRES_DDL:
+        event.listen(
+            Course.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect="postgresql")
+        )
+
+
+_attach_ddl()
+
+
+def rebuild_search_index():
+    """Create the index on an existing database and repopulate it."""
+
+    dialect = db.engine.dialect.name
+
+    with db.engine.begin() as conn:
+        if dialect == "sqlite":
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+            conn.execute(text(
+                "INSERT INTO course_fts(course_fts) VALUES ('rebuild')"
+            ))
+        elif dialect == "postgresql":
+            # The generated column is populated by the ALTER itself
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+        else:
+            raise RuntimeError(f"Full-text search is not supported on {dialect}")
+
+
+# ----------------------------------
+# QUERYING
+# ----------------------------------
+def _fts5_match(query):
+    """Turn free text into a safe FTS5 expression (all terms, prefix match)."""
+
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(query))
+
+
+def _hits_sqlite(query):
+    return text(
+        "SELECT course_fts.rowid AS id,"
+        " bm25(course_fts, 10.0, 1.0) AS rank,"
+        " highlight(course_fts, 0, :open, :close) AS title_hl,"
+        " snippet(course_fts, 1, :open, :close, '…', 16) AS excerpt_hl"
+        " FROM course_fts WHERE course_fts MATCH :match"
+    ).bindparams(match=_fts5_match(query), open=_OPEN, close=_CLOSE)
+
+
+def _hits_postgres(query):
+    # Negated so that, as with bm25, a lower rank sorts first
+    return text(
+        "SELECT course.id AS id,"
+        " -ts_rank_cd(course.search_vector, q) AS rank,"
+        " ts_headline('english', course.title, q,"
+        "   'HighlightAll=true, StartSel=' || :open || ', StopSel=' || :close)"
+        "   AS title_hl,"
+        " ts_headline('english', course.description, q,"
+        "   'MaxWords=24, MinWords=8, StartSel=' || :open || ', StopSel=' || :close)"
+        "   AS excerpt_hl"
+        " FROM course, websearch_to_tsquery('english', :match) AS q"
+        " WHERE course.search_vector @@ q"
+    ).bindparams(match=query, open=_OPEN, close=_CLOSE)
+
+
+def highlight(value):
+    """Escape `value` and turn match sentinels into <mark> tags."""
+
+    escaped = str(escape(value or ""))
+    return Markup(
+        escaped.replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+    )
+
+
+def search_courses(query, after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    """Return a KeysetPage of result rows.
+
+    Each row carries `id`, `instructor_id`, `instructor_name`, `rank`,
+    `title_hl` and `excerpt_hl`; no Course entities are loaded.
+
+    Rows are ordered best match first, ties broken by Course.id. Returns
+    None if `query` contains no searchable terms.
+    """
+
+    if not _TOKEN.search(query or ""):
+        return None
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        hits = _hits_postgres(query)
+    else:
+        hits = _hits_sqlite(query)
+
+    hits = hits.columns(
+        id=Integer, rank=Float, title_hl=String, excerpt_hl=String
+    ).subquery("hits")
+
+    rows = (
+        db.session.query(
+            Course.id,
+            Course.instructor_id,
+            User.username.label("instructor_name"),
+            hits.c.rank,
+            hits.c.title_hl,
+            hits.c.excerpt_hl
+        )
+        .join(hits, hits.c.id == Course.id)
+        .join(User, Course.instructor_id == User.id)
+    )
+
+    return keyset_paginate(
+        rows,
+        (hits.c.rank, Course.id),
+        lambda row: (row.rank, row.id),
+        after=after,
+        before=before,
+        per_page=per_page
+    )
@@ -0,0 +1,251 @@
+"""Production server: preforked gunicorn workers with warm-up.
+
+`flask --app run serve` runs the already created app under gunicorn
+with `preload_app`: the master imports the code and compiles the
+templates once (`Warmup.compile`), then forks the workers. Each worker,
+before it accepts a connection:
+
+1. drops the connection pools inherited from the master
+   (`post_fork`), so no socket is shared between processes;
+2. runs `Warmup.run` (`post_worker_init`): opens its pool, starts the
+   hashing pool and issues the warm-up requests.
+
+A worker therefore only joins the accept queue once it is fast, and
+`/readyz` reports it ready.
+
+Rolling restart (`flask --app run serve-restart`) follows gunicorn's
+binary upgrade: USR2 makes the running master start a new master with
+the new code on the same listening sockets; once `/readyz` has been
+answered by every new worker the old master gets TERM and finishes its
+in-flight requests (`--graceful-timeout`). If the new workers do not
+become ready in time the new master is stopped instead and the old one
+keeps serving.
+
+With more than one worker the per-process "memory" cache only sees its
+own worker's invalidations, so `serve` refuses to start unless
+`CACHE_BACKEND` is shared ("redis") or `CACHE_DEFAULT_TIMEOUT` bounds
+how long the other workers serve stale fragments.
+
+Each worker would also start its own password hashing pool. Unless
+`PASSWORD_HASH_WORKERS` is set, `serve` sizes it from the server
+settings instead (`hash_workers`): single-threaded workers hash inline,
+since they already number more than the CPUs.
+"""
+
+import json
+import os
+import signal
+import time
+import urllib.request
+
+
+class RestartError(RuntimeError):
+    """Raised when a rolling restart could not complete."""
+
+
+class ServeError(RuntimeError):
+    """Raised when the app is configured unsafely for the server."""
+
+
+# ----------------------------------
+# GUNICORN HOOKS
+# ----------------------------------
+def post_fork(server, worker):
+    app = worker.app.wsgi()
+    db = app.extensions["sqlalchemy"]
+
+    # close=False: the master's connections stay open for the master
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    app = worker.app.wsgi()
+    warmup = app.extensions["warmup"]
+    seconds = warmup.run(master=os.getppid(), workers=worker.cfg.workers)
+
+    if warmup.failed:
+        worker.log.error("Worker %s failed warm-up, not ready: %s",
+                         os.getpid(), warmup.failed)
+    else:
+        worker.log.info("Worker %s warmed up in %.0f ms",
+                        os.getpid(), seconds * 1000)
+
+
+def worker_exit(server, worker):
+    # Let a running job finish; an interrupted one is requeued by its lease
+    app = worker.app.wsgi()
+    if "jobs" in app.extensions:
+        app.extensions["jobs"].stop(worker.cfg.graceful_timeout)
+
+
+# ----------------------------------
+# SERVE
+# ----------------------------------
+def check_cache(app, workers):
+    """Raise ServeError if `workers` processes would serve stale pages.
+
+    Returns the seconds another worker may serve a fragment after it
+    was invalidated: 0 for a shared or single-process cache, else
+    `CACHE_DEFAULT_TIMEOUT`.
+    """
+
+    config = app.config
+
+    if workers <= 1 or config["CACHE_BACKEND"] != "memory":
+        return 0
+
+    if not config["CACHE_DEFAULT_TIMEOUT"]:
+        raise ServeError(
+            f"CACHE_BACKEND='memory' is per process: with {workers} workers "
+            "an edit only invalidates the cache of the worker handling it "
+            "and the others serve the old pages indefinitely. Set "
+            "CACHE_BACKEND=redis, or CACHE_DEFAULT_TIMEOUT to bound the "
+            "staleness, or run a single worker (--workers 1)."
+        )
+
+    return config["CACHE_DEFAULT_TIMEOUT"]
+
+
+def hash_workers(app, workers, threads):
+    """Return the hashing processes each of `workers` workers should start.
+
+    An explicit `PASSWORD_HASH_WORKERS` is kept. Otherwise a worker
+    with one thread hashes inline: it handles one request at a time, so
+    a pool would only add idle processes. A threaded worker gets a pool
+    of at most `threads` processes, sharing the CPUs with the others.
+    """
+
+    if app.config["PASSWORD_HASH_WORKERS"] is not None:
+        return app.config["PASSWORD_HASH_WORKERS"]
+
+    if threads <= 1:
+        return 0
+
+    return max(1, min(threads, (os.cpu_count() or 1) // workers))
+
+
+def serve(app, **options):
+    """Run `app` under gunicorn until it is stopped.
+
+    `options` are gunicorn settings (bind, workers, threads, timeout,
+    graceful_timeout, pidfile, ...). Raises ServeError, before binding
+    anything, if the cache configuration is unsafe (`check_cache`).
+    """
+
+    from gunicorn.app.base import BaseApplication
+
+    stale = check_cache(app, options.get("workers") or 1)
+    if stale:
+        app.logger.warning(
+            "Memory cache with %s workers: pages may be up to %s s stale "
+            "in the workers that did not handle an edit; use "
+            "CACHE_BACKEND=redis to invalidate them all at once.",
+            options["workers"], stale
+        )
+
+    app.extensions["password_hasher"].workers = hash_workers(
+        app, options.get("workers") or 1, options.get("threads") or 1
+    )
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", post_fork)
+            self.cfg.set("post_worker_init", post_worker_init)
+            self.cfg.set("worker_exit", worker_exit)
+
+        def load(self):
+            return app
+
+    # Once, before forking: the workers inherit the compiled templates
+    app.extensions["warmup"].compile()
+
+    Server().run()
+
+
+# ----------------------------------
+# ROLLING RESTART
+# ----------------------------------
+def read_pid(path):
+    try:
+        with open(path) as fh:
+            return int(fh.read().strip() or 0) or None
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def probe(url, timeout=2):
+    """The JSON body of a ready `/readyz` answer, or None."""
+
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
+
+
+def rolling_restart(pidfile, ready_url, timeout=60, echo=print):
+    """Replace the master in `pidfile` (and its workers) with new code.
+
+    Returns the new master's pid; raises RestartError, leaving the old
+    master serving, if the new workers are not ready within `timeout`.
+    """
+
+    old = read_pid(pidfile)
+    if old is None or not _alive(old):
+        raise RestartError(f"No running server in {pidfile}.")
+
+    os.kill(old, signal.SIGUSR2)
+    deadline = time.monotonic() + timeout
+
+    new = None
+    while new is None:
+        if time.monotonic() > deadline:
+            raise RestartError("The new master did not start.")
+        time.sleep(0.1)
+        new = read_pid(pidfile + ".2")
+
+    echo(f"New master {new} started; waiting for its workers.")
+
+    # Connections are spread over both masters' workers; keep probing
+    # until every new worker has answered
+    ready = set()
+    expected = None
+    while expected is None or len(ready) < expected:
+        if time.monotonic() > deadline or not _alive(new):
+            if _alive(new):
+                os.kill(new, signal.SIGTERM)
+            raise RestartError(
+                "New workers did not become ready; old master kept serving."
+            )
+
+        body = probe(ready_url)
+        if body and body.get("master") == new and body.get("status") == "ready":
+            ready.add(body["pid"])
+            expected = body["workers"]
+        else:
+            time.sleep(0.05)
+
+    echo(f"{len(ready)} new worker(s) ready; stopping old master {old}.")
+    os.kill(old, signal.SIGTERM)
+
+    while _alive(old):
+        time.sleep(0.1)
+
+    return new
@@ -0,0 +1,267 @@
+"""Uploaded course thumbnails and their resized variants.
+
+An upload is validated with Pillow and stored once under
+`THUMBNAIL_DIR/originals/<key>`, where `key` is a hash of its bytes;
+`Course.thumbnail_key` points at it. A background job (the
+`render_thumbnail` task, see app.jobs) then renders every variant the
+cards use:
+
+    <key>-card.webp  <key>-card.jpg        400x200, the card slot
+    <key>-card@2x.webp  <key>-card@2x.jpg  800x400, high-DPI screens
+
+`/thumbnails/<key>-<variant>.<ext>` serves them with a far-future,
+immutable `Cache-Control`: a new upload has a new key, so a URL never
+changes content. A variant requested before the job got to it is
+rendered on the spot, so a card never shows a broken image.
+
+Courses without an upload keep using the remote `Course.thumbnail`
+URL. `flask --app run ingest-thumbnails` downloads those into the same
+pipeline (and adds the `thumbnail_key` column to older databases, see
+`database.ensure_thumbnail_key_column`).
+"""
+
+import hashlib
+import io
+import os
+import re
+import urllib.request
+
+from flask import abort, current_app, url_for
+from PIL import Image, ImageOps
+
+from .files import send_immutable, write_atomic
+from .jobs import task
+
+
+# (name, width, height): the card image slot is 200px high and at most
+# ~400px wide; @2x covers high-DPI screens
+VARIANTS = (
+    ("card", 400, 200),
+    ("card@2x", 800, 400),
+)
+
+# (extension, Pillow format, save options)
+FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+
+ACCEPTED_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+
+_VARIANT_NAME = re.compile(r"^([0-9a-f]{16})-([\w@]+)\.(\w+)$")
+
+
+class ThumbnailError(ValueError):
+    """Raised for uploads that are not an acceptable image."""
+
+
+def content_key(data):
+    """Return the storage key for the image bytes `data`."""
+
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def variant_filename(key, variant, extension):
+    return f"{key}-{variant}.{extension}"
+
+
+# ----------------------------------
+# FILES
+# ----------------------------------
+def _open_image(source, max_pixels):
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError:
+        raise ThumbnailError("The thumbnail is too large.")
+    except Exception:
+        raise ThumbnailError("The thumbnail is not an image.")
+
+    if image.format not in ACCEPTED_FORMATS:
+        raise ThumbnailError(
+            f"Thumbnails must be {', '.join(ACCEPTED_FORMATS)} images."
+        )
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ThumbnailError("The thumbnail is too large.")
+
+    return image
+
+
+def store_original(directory, data, max_pixels):
+    """Validate and store the image bytes `data`; return its key."""
+
+    image = _open_image(io.BytesIO(data), max_pixels)
+
+    try:
+        image.verify()
+    except Exception:
+        raise ThumbnailError("The thumbnail image is damaged.")
+
+    key = content_key(data)
+    originals = os.path.join(directory, "originals")
+    os.makedirs(originals, exist_ok=True)
+
+    path = os.path.join(originals, key)
+    if not os.path.exists(path):
+        write_atomic(path, data)
+
+    return key
+
+
+def render_variants(directory, key, max_pixels):
+    """Write every missing variant of the original `key`.
+
+    Returns the number of files written; existing variants are kept.
+    """
+
+    wanted = [
+        (variant, width, height, extension, fmt, options)
+        for variant, width, height in VARIANTS
+        for extension, fmt, options in FORMATS
+        if not os.path.exists(os.path.join(
+            directory, variant_filename(key, variant, extension)
+        ))
+    ]
+
+    if not wanted:
+        return 0
+
+    with open(os.path.join(directory, "originals", key), "rb") as fh:
+        image = _open_image(fh, max_pixels)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    for variant, width, height, extension, fmt, options in wanted:
+        resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        write_atomic(
+            os.path.join(directory, variant_filename(key, variant, extension)),
+            lambda fh: resized.save(fh, fmt, **options)
+        )
+
+    return len(wanted)
+
+
+# ----------------------------------
+# INGESTION
+# ----------------------------------
+def download(url, max_bytes, timeout=10):
+    """Fetch `url`; return its bytes or raise ThumbnailError."""
+
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    except (OSError, ValueError) as exc:
+        raise ThumbnailError(f"Could not download {url}: {exc}")
+
+    if len(data) > max_bytes:
+        raise ThumbnailError(f"{url} is larger than {max_bytes} bytes.")
+
+    return data
+
+
+# ----------------------------------
+# EXTENSION
+# ----------------------------------
+class Thumbnails:
+    """Flask extension storing uploads and rendering variants off-request."""
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.max_bytes = 0
+        self.max_pixels = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("THUMBNAIL_DIR", None)
+        app.config.setdefault("THUMBNAIL_MAX_BYTES", 5 * 1024 * 1024)
+        app.config.setdefault("THUMBNAIL_MAX_PIXELS", 40_000_000)
+
+        self.directory = app.config["THUMBNAIL_DIR"] or os.path.join(
+            app.instance_path, "thumbnails"
+        )
+        self.max_bytes = app.config["THUMBNAIL_MAX_BYTES"]
+        self.max_pixels = app.config["THUMBNAIL_MAX_PIXELS"]
+
+        app.add_url_rule(
+            "/thumbnails/<name>", "thumbnail", self.serve
+        )
+        app.add_template_global(self.url, "thumbnail_url")
+        app.extensions["thumbnails"] = self
+
+    # ----------------------------------
+    # RENDERING
+    # ----------------------------------
+    def render(self, key):
+        """Render the variants of `key` now; return the files written."""
+
+        return render_variants(self.directory, key, self.max_pixels)
+
+    def submit(self, key, owner_id=None):
+        """Enqueue rendering `key` onto the current session; return the Job.
+
+        It runs once the caller commits; until then the serving route
+        renders variants on demand.
+        """
+
+        return current_app.extensions["jobs"].enqueue(
+            "render_thumbnail", key=key, owner_id=owner_id
+        )
+
+    # ----------------------------------
+    # API
+    # ----------------------------------
+    def store(self, data):
+        """Validate and store uploaded bytes; return the new key.
+
+        Raises ThumbnailError for anything but an acceptable image.
+        """
+
+        if len(data) > self.max_bytes:
+            raise ThumbnailError(
+                f"Thumbnails are limited to {self.max_bytes // (1024 * 1024)} MB."
+            )
+
+        return store_original(self.directory, data, self.max_pixels)
+
+    def store_upload(self, upload):
+        """Store a Werkzeug FileStorage; return its key, or None if empty."""
+
+        if upload is None or not upload.filename:
+            return None
+
+        data = upload.stream.read(self.max_bytes + 1)
+        if not data:
+            return None
+
+        return self.store(data)
+
+    def url(self, key, variant="card", extension="jpg"):
+        return url_for(
+            "thumbnail", name=variant_filename(key, variant, extension)
+        )
+
+    def serve(self, name):
+        """Send one variant, rendering it first if the job has not yet."""
+
+        match = _VARIANT_NAME.match(name)
+        if match is None:
+            abort(404)
+
+        key, variant, extension = match.groups()
+        if variant not in {v[0] for v in VARIANTS} \
+                or extension not in {f[0] for f in FORMATS}:
+            abort(404)
+
+        if not os.path.exists(os.path.join(self.directory, name)):
+            if not os.path.exists(os.path.join(self.directory, "originals", key)):
+                abort(404)
+            self.render(key)
+
+        return send_immutable(self.directory, name)
+
+
+@task("render_thumbnail", max_attempts=5)
+def render_thumbnail(key):
+    return current_app.extensions["thumbnails"].render(key)
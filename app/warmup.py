@@ -0,0 +1,164 @@
+"""Warm-up before serving traffic, and the readiness endpoint.
+
+A freshly started process pays for a lot on its first requests: Jinja
+compiles each template, Werkzeug compiles the URL map, the asset
+manifest is read, the database pool opens its connections (running the
+SQLite PRAGMAs), the password hashing pool forks, and the catalog
+queries start on a cold page cache. `Warmup` moves all of that before
+the process accepts connections:
+
+- `compile()` does the fork-safe part (templates, routes, assets); the
+  `serve` command runs it once in the preloading master so every worker
+  inherits the compiled templates.
+- `run()` does the rest in each worker (see app.server): connect every
+  engine, start the hashing pool and issue `WARMUP_PATHS` as internal
+  requests, which also fills the fragment caches.
+
+`/readyz` answers 503 until `run()` has finished and 200 afterwards,
+as long as the primary database answers; load balancers and
+`flask serve-restart` poll it. A warm-up request answering 5xx leaves
+the process unready (503 "warm-up failed"), so a broken deploy never
+takes traffic and a rolling restart keeps the old workers.
+"""
+
+import os
+import time
+
+from flask import jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class Warmup:
+    """Flask extension preparing a process before it serves requests."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.paths = ()
+        self.ready = False
+        self.failed = {}
+        self.seconds = None
+        self.server = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("WARMUP_PATHS", ("/",))
+
+        self.app = app
+        self.paths = tuple(app.config["WARMUP_PATHS"])
+        self.ready = False
+        self.failed = {}
+
+        app.add_url_rule("/readyz", "readyz", self.readiness)
+        app.extensions["warmup"] = self
+
+    # ----------------------------------
+    # STEPS
+    # ----------------------------------
+    def compile(self):
+        """Compile every template and the URL map; load the asset manifest.
+
+        Touches no connection or pool, so it is safe before forking.
+        Returns the number of templates compiled.
+        """
+
+        app = self.app
+        templates = [
+            name for name in app.jinja_env.list_templates()
+            if name.endswith(".html")
+        ]
+        for name in templates:
+            app.jinja_env.get_template(name)
+
+        app.url_map.update()
+
+        if "assets" in app.extensions:
+            app.extensions["assets"].manifest()
+
+        return len(templates)
+
+    def connect(self):
+        """Open (and check) a pooled connection on every engine."""
+
+        db = self.app.extensions["sqlalchemy"]
+
+        with self.app.app_context():
+            for engine in db.engines.values():
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+
+    def request(self, path):
+        """Issue one internal GET for `path`; return its status code."""
+
+        with self.app.test_client() as client:
+            return client.get(path).status_code
+
+    def run(self, **server):
+        """Warm this process up, then report it ready.
+
+        `server` (master pid, worker count) is echoed by `/readyz`.
+        If a warm-up request answers 5xx the process stays unready;
+        `failed` maps those paths to their status codes.
+        """
+
+        started = time.perf_counter()
+        app = self.app
+
+        with app.app_context():
+            self.compile()
+            self.connect()
+
+            if "password_hasher" in app.extensions:
+                app.extensions["password_hasher"].warm()
+
+        failed = {}
+
+        for path in self.paths:
+            status = self.request(path)
+            if status >= 500:
+                failed[path] = status
+                app.logger.error("Warm-up request %s answered %s", path, status)
+            elif status >= 400:
+                app.logger.warning("Warm-up request %s answered %s", path, status)
+
+        self.server = server
+        self.failed = failed
+        self.seconds = time.perf_counter() - started
+        self.ready = not failed
+
+        return self.seconds
+
+    # ----------------------------------
+    # READINESS
+    # ----------------------------------
+    def readiness(self):
+        """200 once warmed up and the primary database answers, else 503."""
+
+        body = {"pid": os.getpid(), **self.server}
+
+        if self.failed:
+            status = 503
+            body["status"] = "warm-up failed"
+            body["failed"] = self.failed
+        elif not self.ready:
+            status = 503
+            body["status"] = "starting"
+        else:
+            db = self.app.extensions["sqlalchemy"]
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except SQLAlchemyError:
+                status = 503
+                body["status"] = "database unavailable"
+            else:
+                status = 200
+                body["status"] = "ready"
+                body["warmup_ms"] = round(self.seconds * 1000, 1)
+
+        response = jsonify(body)
+        response.status_code = status
+        response.cache_control.no_store = True
+        return response
@@ -0,0 +1,4 @@
+"""Benchmarks and query-count checks for the LMS app.
+
+Run modules from the repository root, e.g. `python -m bench.query_counts`.
+"""
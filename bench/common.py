@@ -0,0 +1,30 @@
+"""Helpers shared by the benchmark and query-count scripts."""
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Count statements executed on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def login_as(client, user_id):
+    """Attach a Flask-Login session for `user_id` to the test client."""
+
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
@@ -0,0 +1,227 @@
+"""Concurrent read/write throughput for each database profile.
+
+Forks `--readers` + `--writers` worker processes (like a preforking
+server) against a fresh copy of a generated SQLite dataset and runs
+them for `--duration` seconds:
+
+- readers cycle through the catalog and search pages;
+- writers are distinct students alternating enroll / unenroll on
+  random courses, one transaction per request.
+
+For every profile in `--profiles` it reports reads/s, writes/s, p95
+latency and failed requests (HTTP 500s, typically "database is
+locked"):
+
+    python -m bench.concurrency
+    python -m bench.concurrency --dataset medium --writers 8 --json out.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from app import create_app, db
+from app.models import Course, User
+
+from .common import login_as
+from .routes import ensure_dataset, percentile
+
+
+READ_URLS = (
+    "/?sort=title",
+    "/?sort=popularity&order=desc",
+    "/?sort=instructor",
+    "/search?q=programming",
+)
+
+
+# ----------------------------------
+# DATASET COPIES
+# ----------------------------------
+def fresh_copy(source, directory, profile):
+    """Copy `source` into `directory`, in rollback-journal mode."""
+
+    path = os.path.join(directory, f"{profile}.db")
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+
+    # Every profile starts from the same on-disk state; "production"
+    # switches the copy to WAL itself
+    dst.execute("PRAGMA journal_mode=DELETE")
+    dst.close()
+
+    return path
+
+
+def fixtures(path, writers):
+    """Return (student ids, course ids) used by the writer processes."""
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "DATABASE_PROFILE": "default",
+    })
+
+    with app.app_context():
+        students = list(db.session.execute(
+            db.select(User.id).where(User.role == "student")
+            .order_by(User.id).limit(writers)
+        ).scalars())
+        courses = list(db.session.execute(db.select(Course.id)).scalars())
+        db.engine.dispose()
+
+    return students, courses
+
+
+# ----------------------------------
+# WORKERS
+# ----------------------------------
+def make_app(path, profile, deadline, duration):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "DATABASE_PROFILE": profile,
+        "CACHE_BACKEND": "null",
+        "PASSWORD_HASH_WORKERS": 0,
+        "JOBS_WORKERS": 0,
+        # Lock waits are the point here; keep the slow-query log quiet
+        "SLOW_QUERY_THRESHOLD": float("inf"),
+    })
+    # Failed requests are counted, not printed
+    app.logger.disabled = True
+
+    # Start measuring together, once every worker is ready
+    time.sleep(max(0.0, deadline - duration - time.perf_counter()))
+    return app
+
+
+def reader(path, profile, deadline, duration, results, seed):
+    app = make_app(path, profile, deadline, duration)
+    client = app.test_client()
+    rng = random.Random(seed)
+    timings, errors = [], 0
+
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        status = client.get(rng.choice(READ_URLS)).status_code
+        timings.append(time.perf_counter() - start)
+        errors += status >= 500
+
+    results.put(("read", timings, errors))
+
+
+def writer(path, profile, deadline, duration, results, student_id, courses,
+           seed):
+    app = make_app(path, profile, deadline, duration)
+    client = app.test_client()
+    login_as(client, student_id)
+    rng = random.Random(seed)
+    timings, errors = [], 0
+
+    while time.perf_counter() < deadline:
+        course_id = rng.choice(courses)
+
+        for action in ("enroll", "unenroll"):
+            start = time.perf_counter()
+            status = client.get(f"/{action}/{course_id}").status_code
+            timings.append(time.perf_counter() - start)
+            errors += status >= 500
+
+    results.put(("write", timings, errors))
+
+
+# ----------------------------------
+# RUN
+# ----------------------------------
+def run_profile(path, profile, args, students, courses):
+    """Run all workers against `path`; return the aggregated stats."""
+
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    # Leave the workers time to build their apps before the clock starts
+    deadline = time.perf_counter() + 2.0 + args.duration
+    processes = []
+
+    for i in range(args.readers):
+        processes.append(ctx.Process(
+            target=reader,
+            args=(path, profile, deadline, args.duration, results, i)
+        ))
+    for i, student_id in enumerate(students):
+        processes.append(ctx.Process(
+            target=writer,
+            args=(path, profile, deadline, args.duration, results,
+                  student_id, courses, i)
+        ))
+
+    for process in processes:
+        process.start()
+
+    collected = {"read": ([], 0), "write": ([], 0)}
+    for _ in processes:
+        kind, timings, errors = results.get()
+        previous, previous_errors = collected[kind]
+        collected[kind] = (previous + timings, previous_errors + errors)
+
+    for process in processes:
+        process.join()
+
+    stats = {"profile": profile}
+    for kind, (timings, errors) in collected.items():
+        timings.sort()
+        stats[f"{kind}s_per_sec"] = round(len(timings) / args.duration, 1)
+        stats[f"{kind}_p95_ms"] = (
+            round(percentile(timings, 95) * 1000, 2) if timings else None
+        )
+        stats[f"{kind}_errors"] = errors
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", choices=("small", "medium", "large"),
+                        default="small")
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds per profile")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write results as JSON to PATH")
+    args = parser.parse_args(argv)
+
+    source = ensure_dataset(args.dataset)
+    rows = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in args.profiles:
+            path = fresh_copy(source, directory, profile)
+            students, courses = fixtures(path, args.writers)
+            rows.append(run_profile(path, profile, args, students, courses))
+
+    print(f"{args.readers} readers, {args.writers} writers, "
+          f"{args.duration:g}s per profile, dataset {args.dataset}")
+    print(f"{'profile':12} {'reads/s':>9} {'p95 ms':>8} {'errors':>7}"
+          f" {'writes/s':>9} {'p95 ms':>8} {'errors':>7}")
+    for row in rows:
+        print(f"{row['profile']:12} {row['reads_per_sec']:9} {row['read_p95_ms']!s:>8}"
+              f" {row['read_errors']:7} {row['writes_per_sec']:9}"
+              f" {row['write_p95_ms']!s:>8} {row['write_errors']:7}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(rows, fh, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
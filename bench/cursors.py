@@ -0,0 +1,101 @@
+"""Fail if a keyset endpoint errors on a crafted page cursor.
+
+Cursors are opaque tokens from the query string, so anyone can send
+any base64 JSON. `decode_cursor` must turn everything it cannot bind
+(nested lists, objects, out-of-range integers, a wrong length) into
+"start from the first page". This feeds such cursors as `after` and
+`before` to every keyset-paginated route, as each kind of viewer, and
+exits non-zero on any 5xx.
+
+    python -m bench.cursors
+"""
+
+import base64
+import json
+import sys
+
+from app import create_app
+
+from .common import login_as
+from .query_counts import build_dataset
+
+
+SCALE = 5
+
+# Malformed payloads, sized for every keyset in use (1 to 3 values)
+CRAFTED = [
+    [[1], [2]],
+    [0, [1], [2]],
+    [{"a": 1}, 1],
+    ["x", 10 ** 30],
+    [-(10 ** 30)],
+    [10 ** 30, "x", 1],
+    [1.5, [1]],
+    [[0], "x", 1],
+    [99, "x", 1],
+    [],
+    {"a": 1},
+    "x",
+]
+
+
+def _tokens():
+    for values in CRAFTED:
+        raw = json.dumps(values).encode("utf-8")
+        yield base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    yield "not base64 !"
+
+
+def main():
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "CACHE_BACKEND": "null",
+        "JOBS_WORKERS": 0,
+    })
+
+    with app.app_context():
+        instructor_id, student_id, course_id = build_dataset(SCALE)
+
+    users = {
+        "anonymous": None,
+        "student": student_id,
+        "instructor": instructor_id,
+    }
+    routes = [
+        (role, f"/?sort={sort}&order={order}")
+        for role in users
+        for sort in ("title", "instructor", "popularity")
+        for order in ("asc", "desc")
+    ]
+    routes += [
+        ("anonymous", "/search?q=Own"),
+        ("student", "/search?q=Own"),
+        ("instructor", f"/course/{course_id}/students"),
+    ]
+
+    failed = 0
+
+    for role, route in routes:
+        client = app.test_client()
+        if users[role] is not None:
+            login_as(client, users[role])
+
+        for token in _tokens():
+            for direction in ("after", "before"):
+                url = f"{route}&{direction}={token}" if "?" in route \
+                    else f"{route}?{direction}={token}"
+                status = client.get(url).status_code
+
+                if status >= 500:
+                    failed += 1
+                    print(f"FAIL  {status}  {role:10} {url}")
+
+    checked = len(routes) * (len(CRAFTED) + 1) * 2
+    print(f"{checked - failed}/{checked} crafted cursor requests answered without error.")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
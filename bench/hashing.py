@@ -0,0 +1,80 @@
+"""Benchmark password verification cost: logins per second per core.
+
+Each login costs one `check_password_hash`, so this times repeated
+verifications of a single hash on one core for every algorithm/cost
+setting and reports the resulting logins/sec/core. Use it to pick
+`PASSWORD_HASH_ALGORITHM` / `PASSWORD_HASH_COST` for the hardware the
+app is deployed on.
+
+    python -m bench.hashing
+    python -m bench.hashing --json results.json --rounds 20
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from app.hashing import hash_method, hash_password, verify_password
+
+
+PASSWORD = "correct horse battery staple"
+
+SETTINGS = [
+    ("scrypt", 2 ** 14),
+    ("scrypt", 2 ** 15),
+    ("scrypt", 2 ** 16),
+    ("pbkdf2:sha256", 260000),
+    ("pbkdf2:sha256", 600000),
+    ("pbkdf2:sha256", 1000000),
+]
+
+
+def measure(algorithm, cost, rounds):
+    """Return timing stats for `rounds` verifications at one setting."""
+
+    stored = hash_password(PASSWORD, hash_method(algorithm, cost))
+    timings = []
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        verify_password(stored, PASSWORD)
+        timings.append(time.perf_counter() - start)
+
+    mean = sum(timings) / len(timings)
+
+    return {
+        "algorithm": algorithm,
+        "cost": cost,
+        "rounds": rounds,
+        "mean_ms": round(mean * 1000, 2),
+        "logins_per_sec_per_core": round(1 / mean, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write results as JSON to PATH")
+    args = parser.parse_args(argv)
+
+    results = []
+
+    print(f"{'algorithm':15} {'cost':>9} {'ms/login':>9} {'logins/s/core':>14}")
+
+    for algorithm, cost in SETTINGS:
+        result = measure(algorithm, cost, args.rounds)
+        results.append(result)
+        print(f"{algorithm:15} {cost:>9} {result['mean_ms']:>9} "
+              f"{result['logins_per_sec_per_core']:>14}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
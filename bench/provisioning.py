@@ -0,0 +1,100 @@
+"""Fail if a user-provisioning report discloses a supplied password.
+
+Provisions a CSV in which every row supplies a password, with rows
+landing in each report status (created, invalid_row, duplicate,
+email_taken, username_taken and, by making the batched INSERT lose a
+simulated race, conflict), and checks that `initial_password` is empty
+on all of them. Rows without a password must still get a generated one.
+
+    python -m bench.provisioning
+"""
+
+import contextlib
+import io
+import sys
+from unittest import mock
+
+from app import bulk, create_app, db
+from app.bulk import provision_users, read_user_csv
+from app.models import User
+
+
+SUPPLIED = """username,email,role,password
+taken,someone@x.com,student,Supplied-1
+other,taken@x.com,student,Supplied-2
+alice,alice@x.com,student,Supplied-3
+alice,alice2@x.com,student,Supplied-4
+,bad,student,Supplied-5
+carol,carol@x.com,wizard,Supplied-6
+"""
+
+RACED = """username,email,role,password
+dave,dave@x.com,instructor,Supplied-7
+"""
+
+GENERATED = """username,email,role,password
+erin,erin@x.com,student,
+"""
+
+STATUSES = {
+    "created", "invalid_row", "duplicate", "email_taken", "username_taken",
+    "conflict",
+}
+
+
+def provision(source, insert_users=None):
+    """Provision the CSV text `source`; return its UserResults.
+
+    `insert_users` replaces the batched INSERT, to simulate races.
+    """
+
+    patch = mock.patch.object(bulk, "_insert_users", insert_users) \
+        if insert_users else contextlib.nullcontext()
+
+    with patch:
+        return list(provision_users(read_user_csv(io.StringIO(source)), workers=1))
+
+
+def main():
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "JOBS_WORKERS": 0,
+        # Hash cost is irrelevant here
+        "PASSWORD_HASH_COST": 2 ** 14,
+    })
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="taken", email="taken@x.com",
+                            password="x", role="student"))
+        db.session.commit()
+
+        results = provision(SUPPLIED)
+        results += provision(RACED, insert_users=lambda rows: set())
+        generated = provision(GENERATED)
+
+    failed = False
+
+    for result in results:
+        leaked = result.initial_password != ""
+        failed = failed or leaked
+        print(f"{'FAIL' if leaked else 'ok':4}  line {result.line:2}  {result.status}")
+
+    missing = STATUSES - {result.status for result in results}
+    if missing:
+        failed = True
+        print(f"FAIL  statuses not exercised: {', '.join(sorted(missing))}")
+
+    if not generated[0].initial_password:
+        failed = True
+        print("FAIL  a row without a password got no generated one")
+
+    if failed:
+        print("Provisioning report discloses supplied passwords.")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
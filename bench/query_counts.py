@@ -0,0 +1,163 @@
+"""Fail if any route's SQL query count grows with the number of rows.
+
+Builds two throw-away in-memory databases, one small and one several
+times larger, renders every list view against each as the appropriate
+user and compares the number of SQL statements issued. A route that
+lazy-loads per row (an N+1) issues more statements on the larger
+dataset and makes this script exit non-zero.
+
+    python -m bench.query_counts
+"""
+
+import sys
+
+from app import create_app, db, identity_cache
+from app.analytics import backfill_events, catch_up
+from app.counters import repair_enrollment_counts
+from app.models import Course, Enrollment, User
+from app.pagination import MAX_PER_PAGE
+
+from .common import QueryCounter, login_as
+
+
+# LARGE * 2 courses must still fit on one catalog page
+SMALL = 5
+LARGE = 40
+
+
+# ----------------------------------
+# DATASET
+# ----------------------------------
+def build_dataset(scale):
+    """Create a dataset whose list views all grow linearly with `scale`.
+
+    The first instructor owns `scale` courses, `scale` further
+    instructors own one course each (so catalog cards reference many
+    distinct instructors) and `scale` students are enrolled in every
+    course of the first instructor.
+    """
+
+    db.drop_all()
+    db.create_all()
+    identity_cache.clear()
+
+    instructors = [
+        User(username=f"tp{i}", email=f"tp{i}@l.com", password="x",
+             role="instructor")
+        for i in range(scale + 1)
+    ]
+    students = [
+        User(username=f"st{i}", email=f"st{i}@l.com", password="x",
+             role="student")
+        for i in range(scale)
+    ]
+    db.session.add_all(instructors + students)
+    db.session.flush()
+
+    owner = instructors[0]
+    own = [
+        Course(title=f"Own {i}", description="x" * 200,
+               instructor_id=owner.id)
+        for i in range(scale)
+    ]
+    others = [
+        Course(title=f"Other {i}", description="x" * 200,
+               instructor_id=instructor.id)
+        for i, instructor in enumerate(instructors[1:])
+    ]
+    db.session.add_all(own + others)
+    db.session.flush()
+
+    db.session.add_all(
+        Enrollment(student_id=student.id, course_id=course.id)
+        for student in students
+        for course in own
+    )
+    db.session.commit()
+    repair_enrollment_counts()
+
+    # Dashboard trends read the rollup, which grows with the data too
+    backfill_events()
+    catch_up()
+
+    return owner.id, students[0].id, own[0].id
+
+
+# ----------------------------------
+# MEASUREMENT
+# ----------------------------------
+def measure(app, scale):
+    """Return {route label: query count} for a dataset of `scale`."""
+
+    with app.app_context():
+        instructor_id, student_id, course_id = build_dataset(scale)
+        engine = db.engine
+
+    per_page = MAX_PER_PAGE
+    users = {
+        "anonymous": None,
+        "student": student_id,
+        "instructor": instructor_id,
+    }
+    routes = [
+        ("anonymous", f"/?sort=title&per_page={per_page}"),
+        ("anonymous", f"/?sort=instructor&per_page={per_page}"),
+        ("anonymous", f"/?sort=popularity&order=desc&per_page={per_page}"),
+        ("student", f"/?sort=title&per_page={per_page}"),
+        ("instructor", f"/?sort=instructor&per_page={per_page}"),
+        ("instructor", "/dashboard"),
+        ("instructor", "/course/%d/students"),
+        ("instructor", "/course/%d/students.csv"),
+        ("student", "/student-dashboard"),
+    ]
+
+    counts = {}
+
+    for role, route in routes:
+        url = route % course_id if "%d" in route else route
+        client = app.test_client()
+        if users[role] is not None:
+            login_as(client, users[role])
+
+        # buffered: streamed responses are consumed inside the counter
+        with QueryCounter(engine) as counter:
+            response = client.get(url, buffered=True)
+
+        if response.status_code != 200:
+            raise SystemExit(f"{url} returned {response.status_code}")
+
+        # Course ids differ between datasets; label by route shape
+        counts[f"{role:10} {route}"] = counter.count
+
+    return counts
+
+
+def main():
+    # In-memory database; measure the database path, not the fragment cache
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "CACHE_BACKEND": "null",
+        # Worker polls would be counted as the routes' queries
+        "JOBS_WORKERS": 0,
+    })
+
+    small = measure(app, SMALL)
+    large = measure(app, LARGE)
+
+    failed = False
+
+    for label, count in small.items():
+        grew = large[label] != count
+        failed = failed or grew
+        status = "FAIL" if grew else "ok"
+        print(f"{status:4}  {count:3} -> {large[label]:3}  {label}")
+
+    if failed:
+        print("Query count grows with row count (N+1).")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
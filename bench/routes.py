@@ -0,0 +1,344 @@
+"""Route-level benchmark suite.
+
+Drives every view in `app/routes.py` and `app/auth.py` through the
+Flask test client against generated datasets and records, per route,
+p50/p95/p99 latency, SQL statement count and peak Python memory.
+
+Datasets are built once with `seed.py` into `bench/data/` and reused.
+Results are written as JSON so two runs can be compared:
+
+    python -m bench.routes --dataset small --output before.json
+    ... change code ...
+    python -m bench.routes --dataset small --output after.json \
+        --compare before.json
+
+`--compare` exits non-zero when a route issues more queries than in
+the baseline or its p95 latency grew by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from app import create_app, db, hasher
+from app.models import Course, Enrollment, User
+
+from .common import QueryCounter, login_as
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "bench", "data")
+
+# Arguments passed to seed.py for each dataset size
+DATASETS = {
+    "small": [
+        "--instructors", "10", "--students", "1000", "--courses", "200",
+        "--min-enrollments", "1", "--max-enrollments", "5",
+    ],
+    "medium": [
+        "--instructors", "100", "--students", "20000", "--courses", "5000",
+        "--min-enrollments", "1", "--max-enrollments", "8",
+        "--distribution", "zipf",
+    ],
+    "large": [
+        "--instructors", "1000", "--students", "200000", "--courses", "50000",
+        "--min-enrollments", "1", "--max-enrollments", "10",
+        "--distribution", "zipf",
+    ],
+}
+
+PASSWORD = "password"
+
+
+# ----------------------------------
+# DATASETS
+# ----------------------------------
+def dataset_path(name):
+    return os.path.join(DATA_DIR, f"{name}.db")
+
+
+def ensure_dataset(name, rebuild=False):
+    """Generate `bench/data/<name>.db` with seed.py unless it exists."""
+
+    path = dataset_path(name)
+
+    if os.path.exists(path) and not rebuild:
+        return path
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "seed.py"), *DATASETS[name],
+         "--password-mode", "shared", "--password", PASSWORD, "--seed", "1"],
+        env=env,
+        check=True
+    )
+
+    return path
+
+
+# ----------------------------------
+# STATS
+# ----------------------------------
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+
+    if not sorted_values:
+        return None
+
+    index = max(0, min(len(sorted_values) - 1,
+                       round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+    }
+
+
+# ----------------------------------
+# SCENARIOS
+# ----------------------------------
+def pick_fixtures():
+    """Return the users and courses the scenarios act on."""
+
+    student = User.query.filter_by(role="student").order_by(User.id).first()
+    course = Course.query.order_by(Course.enrollment_count.desc()).first()
+    instructor = db.session.get(User, course.instructor_id)
+
+    enrolled = db.session.query(Enrollment.course_id).filter_by(
+        student_id=student.id
+    )
+    free_course = Course.query.filter(
+        Course.id.not_in(enrolled)
+    ).order_by(Course.id).first()
+
+    return {
+        "student_id": student.id,
+        "student_email": student.email,
+        "instructor_id": instructor.id,
+        "course_id": course.id,
+        "free_course_id": free_course.id,
+    }
+
+
+def scenarios(f):
+    """Yield (name, user id or None, method, url, form data, prepare).
+
+    `prepare` is an optional untimed (method, url, data) request issued
+    before every timed one to put the database into the needed state.
+    """
+
+    for sort_by in ("title", "instructor", "popularity"):
+        for order in ("asc", "desc"):
+            yield (f"home sort={sort_by} order={order}", None, "GET",
+                   f"/?sort={sort_by}&order={order}", None, None)
+
+    yield ("home as student", f["student_id"], "GET", "/?sort=title", None, None)
+    yield ("home as instructor", f["instructor_id"], "GET", "/?sort=title", None, None)
+    yield ("search", None, "GET", "/search?q=programming", None, None)
+    yield ("instructor dashboard", f["instructor_id"], "GET", "/dashboard", None, None)
+    yield ("course students", f["instructor_id"], "GET",
+           f"/course/{f['course_id']}/students", None, None)
+    yield ("course students csv", f["instructor_id"], "GET",
+           f"/course/{f['course_id']}/students.csv", None, None)
+    yield ("student dashboard", f["student_id"], "GET", "/student-dashboard", None, None)
+    # Each write is preceded by its inverse so every timed call does work
+    enroll = ("GET", f"/enroll/{f['free_course_id']}", None)
+    unenroll = ("GET", f"/unenroll/{f['free_course_id']}", None)
+    yield ("enroll", f["student_id"], *enroll, unenroll)
+    yield ("unenroll", f["student_id"], *unenroll, enroll)
+    yield ("login", None, "POST", "/login",
+           {"email": f["student_email"], "password": PASSWORD}, None)
+    yield ("login page", None, "GET", "/login", None, None)
+    yield ("register page", None, "GET", "/register", None, None)
+
+
+def request(client, method, url, data):
+    if method == "POST":
+        return client.post(url, data=data)
+    return client.get(url, buffered=True)
+
+
+def run_scenarios(app, iterations):
+    """Return a result dict per scenario."""
+
+    with app.app_context():
+        fixtures = pick_fixtures()
+        engine = db.engine
+
+    results = {}
+    plan = list(scenarios(fixtures))
+    clients = {}
+
+    def client_for(user_id):
+        if user_id not in clients:
+            clients[user_id] = app.test_client()
+            if user_id is not None:
+                login_as(clients[user_id], user_id)
+        return clients[user_id]
+
+    # Warm-up pass (template compilation, pools, caches)
+    for name, user_id, method, url, data, prepare in plan:
+        request(client_for(user_id), method, url, data)
+
+    for name, user_id, method, url, data, prepare in plan:
+        client = client_for(user_id)
+        timings = []
+        queries = 0
+
+        for _ in range(iterations):
+            if prepare:
+                request(client, *prepare)
+
+            with QueryCounter(engine) as counter:
+                start = time.perf_counter()
+                response = request(client, method, url, data)
+                timings.append(time.perf_counter() - start)
+
+            queries += counter.count
+
+        if prepare:
+            request(client, *prepare)
+
+        # Separate pass so tracemalloc overhead does not skew latency
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        request(client, method, url, data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = dict(
+            summarize(timings),
+            status=response.status_code,
+            queries=round(queries / iterations, 2),
+            peak_kb=round(peak / 1024, 1),
+            iterations=iterations,
+        )
+
+    return results
+
+
+# ----------------------------------
+# COMPARISON
+# ----------------------------------
+def compare(baseline, current, tolerance):
+    """Print per-route deltas; return the list of regressed routes."""
+
+    regressions = []
+
+    for dataset, routes in current["datasets"].items():
+        before_routes = baseline.get("datasets", {}).get(dataset, {})
+
+        for name, after in routes.items():
+            before = before_routes.get(name)
+            if before is None:
+                continue
+
+            more_queries = after["queries"] > before["queries"]
+            slower = after["p95_ms"] > before["p95_ms"] * (1 + tolerance)
+            flag = "REGRESSION" if more_queries or slower else ""
+
+            if flag:
+                regressions.append(f"{dataset}: {name}")
+
+            print(f"{dataset:7} {name:32} p95 {before['p95_ms']:>9} -> "
+                  f"{after['p95_ms']:>9} ms  queries {before['queries']:>5} -> "
+                  f"{after['queries']:>5}  {flag}")
+
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------
+# MAIN
+# ----------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every route.")
+    parser.add_argument("--dataset", action="append",
+                        choices=sorted(DATASETS),
+                        help="dataset(s) to run (default: small)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--cache", default="null",
+                        help="CACHE_BACKEND to run with (default: null)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="regenerate datasets even if they exist")
+    parser.add_argument("--output", metavar="PATH",
+                        help="write results JSON to PATH")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="baseline results JSON to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative p95 growth (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cache": args.cache,
+        "iterations": args.iterations,
+        "datasets": {},
+    }
+
+    for name in args.dataset or ["small"]:
+        path = ensure_dataset(name, args.rebuild)
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+            "CACHE_BACKEND": args.cache,
+            "JOBS_WORKERS": 0,
+        })
+
+        print(f"== {name} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        results = run_scenarios(app, args.iterations)
+        report["datasets"][name] = results
+
+        for route, r in results.items():
+            print(f"{route:32} p50 {r['p50_ms']:>9} p95 {r['p95_ms']:>9} "
+                  f"p99 {r['p99_ms']:>9} ms  queries {r['queries']:>5}  "
+                  f"peak {r['peak_kb']:>8} KB  [{r['status']}]")
+
+        with app.app_context():
+            db.engine.dispose()
+
+    hasher.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s).")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,4 +15,114 @@ class Config:
         "sqlite:///lms.db"
     )
 
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool and SQLite PRAGMAs (see app/database.py):
+    # "production" (WAL, busy_timeout, sized pool, pre-ping) or "default"
+    DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE", "production")
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", 10))
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))
+
+    # Optional read replicas (comma separated URLs; see app/replicas.py).
+    # GET reads go to a replica unless the user wrote in the last
+    # REPLICA_STICKY_SECONDS
+    DATABASE_REPLICA_URLS = tuple(
+        url.strip()
+        for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+        if url.strip()
+    )
+    REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+    # Rendered-fragment cache: "memory" (per process), "redis" or "null"
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    CACHE_REDIS_URL = os.environ.get(
+        "CACHE_REDIS_URL",
+        "redis://localhost:6379/0"
+    )
+    # Seconds a cached fragment lives; 0 keeps it until invalidated.
+    # Required by the memory backend under several server workers
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get("CACHE_DEFAULT_TIMEOUT", 0)) or None
+
+    # Flask-Login identity cache (per process)
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", 10000))
+
+    # Password hashing (see app/hashing.py); changing the algorithm or
+    # cost re-hashes each user's password on their next login
+    PASSWORD_HASH_ALGORITHM = os.environ.get("PASSWORD_HASH_ALGORITHM", "scrypt")
+    PASSWORD_HASH_COST = int(os.environ.get("PASSWORD_HASH_COST", 32768))
+    # Hashing processes per web process (0 hashes inline). Unset: up to
+    # 4, or under `serve` sized from the server settings
+    # (`server.hash_workers`)
+    PASSWORD_HASH_WORKERS = (
+        int(os.environ["PASSWORD_HASH_WORKERS"])
+        if os.environ.get("PASSWORD_HASH_WORKERS") else None
+    )
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(
+        os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", 5.0)
+    )
+
+    # Prometheus metrics at /metrics (see app/metrics.py); set a token
+    # to require "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD", 0.2))
+
+    # On-demand request profiler (see app/profiler.py). Only the listed
+    # usernames may trigger it; output defaults to instance/profiles
+    PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "1") == "1"
+    PROFILER_ADMINS = frozenset(
+        name.strip()
+        for name in os.environ.get("PROFILER_ADMINS", "").split(",")
+        if name.strip()
+    )
+    PROFILER_DIR = os.environ.get("PROFILER_DIR")
+    PROFILER_INTERVAL = float(os.environ.get("PROFILER_INTERVAL", 0.001))
+
+    # Uploaded course thumbnails (see app/thumbnails.py); THUMBNAIL_DIR
+    # defaults to instance/thumbnails
+    THUMBNAIL_DIR = os.environ.get("THUMBNAIL_DIR")
+    THUMBNAIL_MAX_BYTES = int(os.environ.get("THUMBNAIL_MAX_BYTES", 5 * 1024 * 1024))
+
+    # Background jobs (see app/jobs.py): worker threads started in each
+    # web process; 0 leaves jobs to `flask jobs-worker`
+    JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 1))
+    JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", 1.0))
+    JOBS_LEASE_SECONDS = int(os.environ.get("JOBS_LEASE_SECONDS", 300))
+    JOBS_RETRY_BACKOFF = float(os.environ.get("JOBS_RETRY_BACKOFF", 5.0))
+
+    # Enrollment trends (see app/analytics.py): seconds a write waits
+    # before the daily rollup catches up with it
+    ROLLUP_DELAY = float(os.environ.get("ROLLUP_DELAY", 10))
+    # Outside SQLite, the age an event must reach before it is rolled
+    # up (ids are not assigned in commit order there)
+    ROLLUP_LAG = float(os.environ.get("ROLLUP_LAG", 60))
+
+    # Production server (see app/server.py, `flask --app run serve`).
+    # SERVER_PIDFILE defaults to instance/server.pid
+    SERVER_BIND = os.environ.get(
+        "SERVER_BIND", f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+    )
+    SERVER_WORKERS = int(
+        os.environ.get("SERVER_WORKERS", 2 * (os.cpu_count() or 1) + 1)
+    )
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 1))
+    SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 30))
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+    SERVER_PIDFILE = os.environ.get("SERVER_PIDFILE")
+
+    # Internal requests each worker makes before accepting connections
+    WARMUP_PATHS = tuple(
+        path.strip()
+        for path in os.environ.get("WARMUP_PATHS", "/").split(",")
+        if path.strip()
+    )
@@ -1,7 +1,10 @@
 """Application runner.
 
 This module imports the app factory and runs the development server.
-In production you would use a WSGI server instead of this file.
+In production serve it with preforked, warmed-up workers instead
+(see app/server.py); several workers need a shared or expiring cache:
+
+    CACHE_BACKEND=redis flask --app run serve --workers 4
 """
 
 from app import create_app
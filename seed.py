@@ -1,68 +1,44 @@
-"""Database seeder for demo data.
+r"""Synthetic data generator for demos and performance testing.
 
-This script resets the local SQLite database, creates demo instructors
-and students, creates a set of sample courses, and enrolls students
-randomly into courses. Run with `python seed.py` after installing
-requirements and creating the virtual environment.
-"""
+Resets the database configured by `DATABASE_URL` (default: the local
+SQLite file) and fills it with instructors, students, courses and
+enrollments. With no arguments it reproduces the original demo data:
+5 instructors, 15 students, the 55 sample courses and 2-6 random
+enrollments per student, where every password equals the username
+(e.g. tp1 / tp1, st1 / st1).
 
-import random
-from app import create_app, db
-from app.models import User, Course, Enrollment
-from werkzeug.security import generate_password_hash
+Rows are written with batched Core INSERTs in chunked transactions and
+password hashes are computed in parallel (or once, with
+`--password-mode shared`), so multi-million-enrollment datasets take
+minutes:
 
-app = create_app()
-app.app_context().push()
+    python seed.py --instructors 2000 --students 1000000 \
+        --courses 50000 --min-enrollments 1 --max-enrollments 8 \
+        --distribution zipf --password-mode shared --seed 42
 
-# -----------------------------
-# RESET DATABASE
-# -----------------------------
-db.drop_all()
-db.create_all()
-print("Database reset completed.")
+Run `python seed.py --help` for every option.
+"""
 
-# -----------------------------
-# CREATE INSTRUCTORS
-# -----------------------------
-num_instructors = 5
-instructors = []
-
-for i in range(1, num_instructors + 1):
-    instructor = User(
-        username=f"tp{i}",
-        email=f"tp{i}@l.com",
-        password=generate_password_hash(f"tp{i}"),
-        role="instructor"
-    )
-    db.session.add(instructor)
-    instructors.append(instructor)
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from bisect import bisect
+from itertools import accumulate, islice
 
-db.session.commit()
-print(f"{num_instructors} instructors created.")
+from sqlalchemy import bindparam, insert, text, update
 
-# -----------------------------
-# CREATE STUDENTS (3x instructors)
-# -----------------------------
-num_students = num_instructors * 3
-students = []
-
-for i in range(1, num_students + 1):
-    student = User(
-        username=f"st{i}",
-        email=f"st{i}@l.com",
-        password=generate_password_hash(f"st{i}"),
-        role="student"
-    )
-    db.session.add(student)
-    students.append(student)
+from app import create_app, db, hasher
+from app.analytics import backfill_events, catch_up
+from app.hashing import hash_many, hash_method, hash_password
+from app.models import User, Course, Enrollment
 
-db.session.commit()
-print(f"{num_students} students created.")
 
 # -----------------------------
 # COURSE DATA (Title + Image)
 # -----------------------------
-course_data = [
+COURSE_DATA = [
     ("Data Structures", "https://images.unsplash.com/photo-1515879218367-8466d910aaa4"),
     ("Algorithms", "https://images.unsplash.com/photo-1555949963-aa79dcee981c"),
     ("Operating Systems", "https://images.unsplash.com/photo-1518770660439-4636190af475"),
@@ -120,48 +96,297 @@ course_data = [
     ("Reinforcement Learning", "https://images.unsplash.com/photo-1531746790731-6c087fecd65a"),
 ]
 
+
 # -----------------------------
-# CREATE COURSES
+# OPTIONS
 # -----------------------------
-courses = []
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reset the database and generate synthetic LMS data."
+    )
+    parser.add_argument("--instructors", type=int, default=5)
+    parser.add_argument("--students", type=int, default=None,
+                        help="default: 3 x instructors")
+    parser.add_argument("--courses", type=int, default=len(COURSE_DATA))
+    parser.add_argument("--min-enrollments", type=int, default=2,
+                        help="fewest courses per student")
+    parser.add_argument("--max-enrollments", type=int, default=6,
+                        help="most courses per student")
+    parser.add_argument("--distribution", choices=["uniform", "zipf"],
+                        default="uniform",
+                        help="how course popularity is distributed")
+    parser.add_argument("--zipf-s", type=float, default=1.1,
+                        help="Zipf exponent for --distribution zipf")
+    parser.add_argument("--password-mode", choices=["unique", "shared"],
+                        default="unique",
+                        help="unique: password = username, hashed in "
+                             "parallel; shared: one precomputed hash of "
+                             "--password for every user")
+    parser.add_argument("--password", default="password",
+                        help="password for --password-mode shared")
+    parser.add_argument("--hash-cost", type=int, default=None,
+                        help="override PASSWORD_HASH_COST while seeding "
+                             "(hashes are upgraded on next login)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="hashing processes (default: all cores)")
+    parser.add_argument("--history-days", type=int, default=90,
+                        help="spread enrollment dates over this many past "
+                             "days (trend charts)")
+    parser.add_argument("--batch-size", type=int, default=10000,
+                        help="rows per INSERT batch and transaction")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="RNG seed for a reproducible dataset")
 
-for title, image_url in course_data:
+    args = parser.parse_args(argv)
 
-    instructor = random.choice(instructors)
+    if args.students is None:
+        args.students = args.instructors * 3
+    if args.min_enrollments > args.max_enrollments:
+        parser.error("--min-enrollments must not exceed --max-enrollments")
 
-    course = Course(
-        title=title,
-        description=f"This course provides comprehensive knowledge of {title}. "
-                    f"It includes theory, practical implementation and real-world applications.",
-        thumbnail=image_url,
-        instructor_id=instructor.id
-    )
+    return args
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+def batched(rows, size):
+    """Yield lists of up to `size` items from the iterable `rows`."""
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_batched(conn, table, rows, batch_size):
+    """INSERT `rows` in batches, committing after each one."""
+
+    total = 0
+    for batch in batched(rows, batch_size):
+        conn.execute(insert(table), batch)
+        conn.commit()
+        total += len(batch)
+    return total
+
+
+def course_picker(rng, num_courses, distribution, zipf_s):
+    """Return a function that picks a 0-based course index.
+
+    With "zipf" the k-th most popular course is chosen with probability
+    proportional to 1 / k**s; popularity ranks are shuffled so popular
+    courses are spread across instructors and titles.
+    """
+
+    if distribution == "uniform":
+        return lambda: rng.randrange(num_courses)
+
+    ranks = list(range(num_courses))
+    rng.shuffle(ranks)
+    cumulative = list(accumulate(1 / (k + 1) ** zipf_s for k in range(num_courses)))
+    total = cumulative[-1]
+
+    return lambda: ranks[bisect(cumulative, rng.random() * total)]
+
+
+def log(message, started=None, rows=None):
+    if started is None:
+        print(message)
+        return
 
-    db.session.add(course)
-    courses.append(course)
+    elapsed = time.perf_counter() - started
+    rate = f", {rows / elapsed:,.0f} rows/s" if rows and elapsed else ""
+    print(f"{message} ({elapsed:.1f}s{rate})")
 
-db.session.commit()
 
-print(f"{len(courses)} courses created.")
+# -----------------------------
+# GENERATORS
+# -----------------------------
+def user_rows(prefix, role, count, first_id, hashes):
+    for i in range(count):
+        yield {
+            "id": first_id + i,
+            "username": f"{prefix}{i + 1}",
+            "email": f"{prefix}{i + 1}@l.com",
+            "password": hashes[i] if isinstance(hashes, list) else hashes,
+            "role": role,
+        }
+
+
+def course_rows(rng, count, num_instructors):
+    for i in range(count):
+        title, image_url = COURSE_DATA[i % len(COURSE_DATA)]
+        if i >= len(COURSE_DATA):
+            title = f"{title} {i // len(COURSE_DATA) + 1}"
+
+        yield {
+            "id": i + 1,
+            "title": title,
+            "description": f"This course provides comprehensive knowledge of {title}. "
+                           f"It includes theory, practical implementation and real-world applications.",
+            "thumbnail": image_url,
+            "instructor_id": rng.randrange(num_instructors) + 1,
+            "enrollment_count": 0,
+        }
+
+
+def enrollment_rows(rng, args, first_student_id, counts):
+    """Yield distinct (student, course) pairs and tally `counts` per course."""
+
+    pick = course_picker(rng, args.courses, args.distribution, args.zipf_s)
+    most = min(args.max_enrollments, args.courses)
+    fewest = min(args.min_enrollments, most)
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    history = args.history_days * 86400
+
+    for student_id in range(first_student_id, first_student_id + args.students):
+        wanted = rng.randint(fewest, most)
+        chosen = set()
+
+        while len(chosen) < wanted:
+            chosen.add(pick())
+
+        for index in chosen:
+            counts[index] += 1
+            yield {
+                "student_id": student_id,
+                "course_id": index + 1,
+                "created_at": now - timedelta(seconds=rng.randrange(history or 1)),
+            }
+
+
+def password_hashes(args, method, prefix, count):
+    """Return one hash per user (unique mode) or a single shared hash."""
+
+    if args.password_mode == "shared":
+        return hash_password(args.password, method)
+
+    usernames = [f"{prefix}{i + 1}" for i in range(count)]
+    return hash_many(usernames, method, workers=args.workers)
+
 
 # -----------------------------
-# RANDOM ENROLLMENTS
+# MAIN
 # -----------------------------
-for student in students:
+def main(argv=None):
+    args = parse_args(argv)
 
-    # Each student gets 2 to 6 random courses
-    num_courses = random.randint(2, 6)
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    log(f"Seed {seed}.")
 
-    selected_courses = random.sample(courses, num_courses)
+    app = create_app()
+    app.app_context().push()
 
-    for course in selected_courses:
-        enrollment = Enrollment(
-            student_id=student.id,
-            course_id=course.id
+    method = hasher.method
+    if args.hash_cost is not None:
+        method = hash_method(app.config["PASSWORD_HASH_ALGORITHM"], args.hash_cost)
+
+    # -----------------------------
+    # RESET DATABASE
+    # -----------------------------
+    db.drop_all()
+    db.create_all()
+    log("Database reset completed.")
+
+    with db.engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # Throw-away data: trade durability for load speed
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+
+        # -----------------------------
+        # USERS (instructors, then students)
+        # -----------------------------
+        started = time.perf_counter()
+        shared = args.password_mode == "shared"
+        instructor_hashes = password_hashes(args, method, "tp", args.instructors)
+        student_hashes = (
+            instructor_hashes if shared
+            else password_hashes(args, method, "st", args.students)
+        )
+        log(f"Password hashes ready ({args.password_mode}).", started)
+
+        started = time.perf_counter()
+        created = insert_batched(
+            conn, User.__table__,
+            user_rows("tp", "instructor", args.instructors, 1, instructor_hashes),
+            args.batch_size
+        )
+        log(f"{created} instructors created.", started, created)
+
+        started = time.perf_counter()
+        first_student_id = args.instructors + 1
+        created = insert_batched(
+            conn, User.__table__,
+            user_rows("st", "student", args.students, first_student_id, student_hashes),
+            args.batch_size
+        )
+        log(f"{created} students created.", started, created)
+
+        # -----------------------------
+        # CREATE COURSES
+        # -----------------------------
+        started = time.perf_counter()
+        created = insert_batched(
+            conn, Course.__table__,
+            course_rows(rng, args.courses, args.instructors),
+            args.batch_size
+        )
+        log(f"{created} courses created.", started, created)
+
+        # -----------------------------
+        # RANDOM ENROLLMENTS
+        # -----------------------------
+        started = time.perf_counter()
+        counts = [0] * args.courses
+        created = insert_batched(
+            conn, Enrollment.__table__,
+            enrollment_rows(rng, args, first_student_id, counts),
+            args.batch_size
+        )
+        log(f"{created} enrollments created "
+            f"({args.min_enrollments}-{args.max_enrollments} per student, "
+            f"{args.distribution}).", started, created)
+
+        # Counters computed while generating; one executemany per batch
+        started = time.perf_counter()
+        set_count = (
+            update(Course.__table__)
+            .where(Course.__table__.c.id == bindparam("course_id"))
+            .values(enrollment_count=bindparam("count"))
         )
-        db.session.add(enrollment)
+        for batch in batched(
+            ({"course_id": i + 1, "count": n} for i, n in enumerate(counts) if n),
+            args.batch_size
+        ):
+            conn.execute(set_count, batch)
+            conn.commit()
+        log("Enrollment counters set.", started)
+
+        # Ids were assigned explicitly; move Postgres sequences past them
+        if conn.dialect.name == "postgresql":
+            for table in ("user", "course", "enrollment"):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"
+                ))
+            conn.commit()
+
+    # -----------------------------
+    # ENROLLMENT TRENDS
+    # -----------------------------
+    started = time.perf_counter()
+    events = backfill_events()
+    catch_up()
+    log(f"{events} enrollment events rolled up by day.", started, events)
+
+    hasher.shutdown()
+    log("Seeding completed successfully!")
+    return 0
 
-db.session.commit()
 
-print("Students randomly enrolled (2–6 courses each).")
-print("Seeding completed successfully!")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())